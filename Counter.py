@@ -1,27 +1,59 @@
 from os import listdir
+from time import perf_counter
+from functools import partial
 from cv2 import imread
-from torch import int
 from os.path import join, isfile
-from ultralytics import YOLO
 
-from ROI_extractor import image_divider # Codigo que extraen las ROI
+from ROI_extractor import image_divider, dividir_imagen # Codigo que extraen las ROI
 
-def Runner(dir: str, modo: str, conf: int, weight: str):
+_models = dict() # Modelos YOLO ya cargados, por peso
+load_times = dict() # Tiempos de importación y carga de modelos en segundos
+
+def load_model(weight: str):
+    """
+    Carga un modelo YOLO una sola vez por proceso y lo reutiliza en las
+    siguientes llamadas. torch y ultralytics se importan recién aquí para que
+    importar este modulo no retrase el inicio del programa.
+
+    Args:
+        weight (str): Peso del modelo YOLO
+
+    Returns:
+        YOLO: Modelo cargado
+    """
+    if weight not in _models:
+        start = perf_counter()
+        from ultralytics import YOLO
+        load_times.setdefault("import ultralytics", perf_counter() - start)
+
+        start = perf_counter()
+        _models[weight] = YOLO(weight)
+        load_times[f"modelo {weight}"] = perf_counter() - start
+    return _models[weight]
+
+def Runner(dir: str, modo: str, conf: int, weight: str, return_boxes: bool = False,
+           save: bool = True, imgsz: int = None):
     """
     Función main que cuenta la cantidad de personas detectadas en una imagen o
     imagenes de un directorio segun la ruta especificada en 'jpg_path'.
 
     Args:
-        dir (str): Directorio de la imagen a analizar
+        dir (str or np.array): Directorio de la imagen a analizar o la imagen
+            ya cargada (por ejemplo luego de preprocesarla)
         modo (str): Modo de lectura de la imagen, puede ser 'normal' o 'ROI'
         conf (int): Confianza del modelo
         weight (str): Peso del modelo YOLO utilizado para la detección
+        return_boxes (bool): Si es True tambien se entregan las detecciones
+        save (bool): Si es True se guardan las predicciones en 'Predicciones'
+        imgsz (int or str): Tamaño de entrada del modelo, None usa el de ultralytics
+            y 'auto' elige uno por forma de imagen (ver inference_sizing)
 
     Returns:
         int: Cantidad de personas detectadas en la imagen
+        (int, list): Si return_boxes es True, la cantidad y las cajas por imagen
     """
     image_data      = image_reader(dir, modo)
-    person_detected = Counter(image_data, conf, weight)
+    person_detected = Counter(image_data, conf, weight, return_boxes, save, imgsz)
     return person_detected
 
 def image_reader(dir: str, modo: str = "normal"):
@@ -30,12 +62,19 @@ def image_reader(dir: str, modo: str = "normal"):
     numpy.
 
     Args:
-        path (str): Ruta de la imagen a leer
+        path (str or np.array): Ruta de la imagen a leer o imagen ya cargada
         modo (str): Modo de lectura de la imagen, puede ser 'normal' o 'ROI'
 
     Returns:
         np.array: Array de numpy con la imagen
     """
+    if not isinstance(dir, str):
+        # Imagen ya cargada en memoria, las ROI se extraen sin pasar por disco
+        print(f"Image: (en memoria, Modo: {modo})")
+        if modo == "ROI":
+            return dividir_imagen(dir)
+        return [dir]
+
     print(f"Image: {dir}", end = "")
     if isfile(dir):
         print(f"Image: {dir}", end = "")
@@ -67,7 +106,8 @@ def read_from_folder(dir: str):
         images_data.append(imread(image_path))
     return images_data
 
-def Counter(image_data: list, conf: int = 0.2, weight: str = "yolov8x.pt"):
+def Counter(image_data: list, conf: int = 0.2, weight: str = "yolov8x.pt",
+            return_boxes: bool = False, save: bool = True, imgsz: int = None):
     """
     Función que cuenta la cantidad de personas detectadas en una imagen o
     imagenes de un directorio segun la ruta especificada en 'jpg_path'.
@@ -76,27 +116,43 @@ def Counter(image_data: list, conf: int = 0.2, weight: str = "yolov8x.pt"):
         image_data (list): Lista de imagenes a analizar leidas por opencv
         conf (float): Confianza del modelo
         model (str): Modelo YOLO especifico utilizado para la detección
+        return_boxes (bool): Si es True tambien se entregan las cajas
+            (xyxy normalizadas) detectadas en cada imagen
+        save (bool): Si es True se guardan las predicciones en 'Predicciones'
+        imgsz (int or str): Tamaño de entrada del modelo, None usa el de ultralytics
+            y 'auto' elige uno por forma de imagen, agrupando las de igual forma
 
     Returns:
         int: Numero de personas detectadas por el modelo
+        (int, list): Si return_boxes es True, el total y una lista con las
+            cajas de cada imagen
     """
-    model = YOLO(weight)
+    model = load_model(weight)
+    import torch # Ya cargado por ultralytics
+    sizer = None
+    if imgsz == "auto":
+        from inference_sizing import sizer
+        predict, extra = partial(sizer.predict, model), dict()
+    else:
+        predict, extra = model.predict, dict() if imgsz is None else dict(imgsz = imgsz)
 
     # Pesos base con 80 clases solo interesan personas:
-    results = model.predict(image_data,
-                            project     = "Predicciones",
-                            save        = True,
-                            save_txt    = True,
-                            conf        = conf,
-                            line_width  = 2,
-                            # augment     = True,
-                            classes     = 0
+    results = predict(image_data,
+                      project     = "Predicciones",
+                      save        = save,
+                      save_txt    = save,
+                      conf        = conf,
+                      line_width  = 2,
+                      # augment     = True,
+                      classes     = 0,
+                      **extra
     )
     
     total = 0
+    boxes = []
     for i, result in enumerate(results):
         class_names         = result.names
-        class_results       = result.boxes.cls.to(int).tolist()
+        class_results       = result.boxes.cls.to(torch.int).tolist()
         coordenate_results  = result.boxes.xywhn.tolist()
         output_dict         = dict()
         for c, bb in zip(class_results, coordenate_results):
@@ -110,5 +166,36 @@ def Counter(image_data: list, conf: int = 0.2, weight: str = "yolov8x.pt"):
             cantidad += len(output_dict[class_name])
             print(f"image{i}: {cantidad} Personas (Model: {weight})")
         total += cantidad   # Suma de personas detectadas en todas imagen
+        if return_boxes:
+            cajas = result.boxes.xyxyn.tolist()
+            if sizer is not None:
+                # Las cajas vienen normalizadas a la entrada rellena
+                cajas = sizer.to_original(cajas, image_data[i].shape)
+            boxes.append(cajas)
     print(f"Total: {total} Personas (Model: {weight})")
-    return total
\ No newline at end of file
+    if return_boxes:
+        return total, boxes
+    return total
+
+def count_images(image_data: list, conf: float = 0.2, weight: str = "yolov8x.pt"):
+    """
+    Función que corre el modelo sobre un lote de imagenes y entrega la cantidad
+    de personas de cada una por separado, sin guardar las predicciones.
+
+    Args:
+        image_data (list): Lista de imagenes leidas por opencv
+        conf (float): Confianza del modelo
+        weight (str): Peso del modelo YOLO utilizado para la detección
+
+    Returns:
+        list: Cantidad de personas detectadas en cada imagen
+    """
+    if not image_data:
+        return []
+    model = load_model(weight)
+    results = model.predict(image_data,
+                            conf    = conf,
+                            classes = 0,
+                            verbose = False
+    )
+    return [len(result.boxes) for result in results]
\ No newline at end of file
@@ -32,12 +32,8 @@ def extraer_4zonas(imagen_path: str, output_path: str):
     # Cargar la imagen
     imagen = imread(imagen_path)
 
-    # Obtener dimensiones de la imagen
-    alto, ancho = imagen.shape[:2]
-    mitad_alto, mitad_ancho = alto//2, ancho//2
     # Dividir la imagen en cuatro partes
-    partes = [imagen[:mitad_alto, :mitad_ancho], imagen[:mitad_alto, mitad_ancho:],
-              imagen[mitad_alto:, :mitad_ancho], imagen[mitad_alto:, mitad_ancho:]]
+    partes = zonas_4(imagen)
     
     # Guardar las partes divididas
     for i, parte in enumerate(partes):
@@ -54,6 +50,55 @@ def extraer_cruz(imagen_path: str, output_path: str):
     # Cargar la imagen
     imagen = imread(imagen_path)
 
+    # Extraer la cruz de la imagen original
+    cruz_vertical_sup, cruz_vertical_inf, cruz_horizontal_izq, cruz_horizontal_der = zonas_cruz(imagen)
+
+    # Guardar las cruces extraídas
+    imwrite(join(output_path, f"ROI_CV_Sup.jpg"), cruz_vertical_sup)
+    imwrite(join(output_path, f"ROI_CV_Inf.jpg"), cruz_vertical_inf)
+    imwrite(join(output_path, f"ROI_CH_Izq.jpg"), cruz_horizontal_izq)
+    imwrite(join(output_path, f"ROI_CH_Der.jpg"), cruz_horizontal_der)
+
+def dividir_imagen(imagen):
+    """
+    Extrae en memoria las mismas Regiones De Interes que image_divider, sin
+    escribirlas a disco.
+
+    Args:
+        imagen (np.array): Imagen ya cargada
+
+    Returns:
+        list: Las 4 zonas seguidas de las 4 cruces (vistas de la imagen)
+    """
+    return zonas_4(imagen) + zonas_cruz(imagen)
+
+def zonas_4(imagen):
+    """
+    Divide una imagen ya cargada en 4 zonas iguales.
+
+    Args:
+        imagen (np.array): Imagen ya cargada
+
+    Returns:
+        list: Las 4 zonas de la imagen
+    """
+    # Obtener dimensiones de la imagen
+    alto, ancho = imagen.shape[:2]
+    mitad_alto, mitad_ancho = alto//2, ancho//2
+    # Dividir la imagen en cuatro partes
+    return [imagen[:mitad_alto, :mitad_ancho], imagen[:mitad_alto, mitad_ancho:],
+            imagen[mitad_alto:, :mitad_ancho], imagen[mitad_alto:, mitad_ancho:]]
+
+def zonas_cruz(imagen):
+    """
+    Extrae las cruces de una imagen ya cargada.
+
+    Args:
+        imagen (np.array): Imagen ya cargada
+
+    Returns:
+        list: Cruz vertical superior e inferior y horizontal izquierda y derecha
+    """
     # Obtener dimensiones de la imagen
     alto, ancho = imagen.shape[:2]
 
@@ -71,9 +116,4 @@ def extraer_cruz(imagen_path: str, output_path: str):
     cruz_vertical_inf   = imagen[:mitad_alto, inicio_horizontal:fin_horizontal]
     cruz_horizontal_izq = imagen[inicio_vertical:fin_vertical, :mitad_ancho]
     cruz_horizontal_der = imagen[inicio_vertical:fin_vertical, mitad_ancho:]
-
-    # Guardar las cruces extraídas
-    imwrite(join(output_path, f"ROI_CV_Sup.jpg"), cruz_vertical_sup)
-    imwrite(join(output_path, f"ROI_CV_Inf.jpg"), cruz_vertical_inf)
-    imwrite(join(output_path, f"ROI_CH_Izq.jpg"), cruz_horizontal_izq)
-    imwrite(join(output_path, f"ROI_CH_Der.jpg"), cruz_horizontal_der)
\ No newline at end of file
+    return [cruz_vertical_sup, cruz_vertical_inf, cruz_horizontal_izq, cruz_horizontal_der]
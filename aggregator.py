@@ -0,0 +1,468 @@
+"""
+Servidor de agregación local para muchos nodos de conteo.
+
+Los nodos (central_afluencia con url_agregador) envían lotes comprimidos con
+gzip sobre conexiones keep-alive. El agregador descarta los lotes repetidos
+por (nodo, sesión, secuencia), guarda en memoria el último conteo de cada
+nodo por zona y cada cierto intervalo reenvía hacia arriba un registro
+consolidado por zona. Los nodos que dejan de enviar por más de stale_after
+segundos salen de la suma; una zona sin nodos vigentes se reenvía con flag.
+
+Uso:
+    python aggregator.py --puerto 8080 --upstream https://.../deploy
+    python aggregator.py --prueba-carga 300 --duracion 30
+"""
+import json
+import gzip
+import time
+import uuid
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+
+
+def _encode(payload):
+    """Serializa y comprime un payload."""
+    return gzip.compress(json.dumps(payload).encode("utf-8"))
+
+
+def _decode(body, encoding):
+    """Descomprime (si corresponde) y deserializa un payload."""
+    if encoding == "gzip":
+        body = gzip.decompress(body)
+    return json.loads(body)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Handler HTTP/1.1 (keep-alive) que recibe los lotes de los nodos."""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        try:
+            payload = _decode(body, self.headers.get("Content-Encoding"))
+            status, result = 200, self.server.handle_payload(payload)
+        except (ValueError, KeyError, OSError) as error:
+            status, result = 400, {"estado": "error", "detalle": str(error)}
+        response = json.dumps(result).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        pass  # Con cientos de nodos el log por request no sirve
+
+
+class Aggregator(ThreadingHTTPServer):
+    """
+    Servidor que agrega los conteos de muchos nodos y los reenvía consolidados.
+    """
+    daemon_threads = True
+
+    def __init__(self, host="0.0.0.0", port=8080, upstream_url=None, forward_interval=5.0,
+                 upstream_format="registro", dedup_window=1024, stale_after=300.0):
+        """
+        Args:
+            host (str): Interfaz donde escuchar
+            port (int): Puerto donde escuchar
+            upstream_url (str): URL a la que se reenvían los conteos consolidados
+            forward_interval (float): Segundos entre reenvíos
+            upstream_format (str): 'registro' envía un POST por zona (como la API actual),
+                'lote' envía todas las zonas en un solo POST comprimido
+            dedup_window (int): Secuencias recientes recordadas por nodo
+            stale_after (float): Segundos sin recibir datos de un nodo para sacarlo
+                de las zonas (debe ser mayor que el tiempo entre lotes de un nodo)
+        """
+        super().__init__((host, port), _Handler)
+        self.upstream_url = upstream_url
+        self.forward_interval = forward_interval
+        self.upstream_format = upstream_format
+        self.dedup_window = dedup_window
+        self.stale_after = stale_after
+
+        self._lock = threading.Lock()
+        self._seen = {}  # (nodo, sesion) -> [secuencia máxima, deque y set de secuencias recientes, último lote]
+        self.zones = {}  # zona -> {nodo: [último registro del nodo, momento en que se recibió]}
+        self._dirty = set()  # Zonas con datos nuevos desde el último reenvío
+        self._vacated = {}  # zona -> último registro de una zona que se quedó sin nodos
+        self.stats = {"lotes": 0, "duplicados": 0, "registros": 0, "reenviados": 0, "errores_upstream": 0,
+                      "nodos_vencidos": 0}
+
+        self._session = requests.Session()  # Conexión keep-alive hacia arriba
+        self._stop = threading.Event()
+        self._forwarder = threading.Thread(target=self._forward_loop, name="Forwarder", daemon=True)
+
+    # receive methods
+
+    def _is_duplicate(self, node, session, seq):
+        """Registra una secuencia y retorna True si ya se había recibido."""
+        key = (node, session)
+        entry = self._seen.get(key)
+        if entry is None:
+            entry = [seq, deque(), set(), 0.0]
+            self._seen[key] = entry
+        entry[3] = time.monotonic()
+        high, order, recent, _ = entry
+        if seq in recent or seq <= high - self.dedup_window:
+            return True
+        recent.add(seq)
+        order.append(seq)
+        if len(order) > self.dedup_window:
+            recent.discard(order.popleft())
+        entry[0] = max(high, seq)
+        return False
+
+    def handle_payload(self, payload):
+        """
+        Procesa un lote de un nodo.
+
+        Args:
+            payload (dict): {'nodo', 'sesion', 'secuencia', 'registros': [...]}
+
+        Returns:
+            dict: Estado del lote ('ok' o 'duplicado')
+        """
+        node, session, seq = str(payload["nodo"]), payload.get("sesion", ""), int(payload["secuencia"])
+        with self._lock:
+            self.stats["lotes"] += 1
+            if self._is_duplicate(node, session, seq):
+                self.stats["duplicados"] += 1
+                return {"estado": "duplicado", "secuencia": seq}
+
+            received = time.monotonic()
+            for record in payload["registros"]:
+                zone = str(record["zona"])
+                previous = self.zones.setdefault(zone, {}).get(node)
+                # Dentro de una zona solo importa el último conteo de cada nodo
+                if previous is None or record["tiempo"] >= previous[0]["tiempo"]:
+                    self.zones[zone][node] = [record, received]
+                    self._vacated.pop(zone, None)  # La zona vuelve a tener nodos
+                    self._dirty.add(zone)
+                else:
+                    previous[1] = received  # El nodo sigue vivo aunque el registro sea viejo
+                self.stats["registros"] += 1
+        return {"estado": "ok", "secuencia": seq}
+
+    # forward methods
+
+    def consolidate(self, zones=None):
+        """
+        Arma un registro por zona sumando el último conteo de cada nodo.
+
+        Args:
+            zones (iterable): Zonas a consolidar, por defecto todas
+
+        Returns:
+            list: Registros consolidados. Una zona sin nodos vigentes sale con
+                cantidad 0 y flag 1 (fuera de servicio)
+        """
+        with self._lock:
+            self._expire()
+            records = []
+            for zone in (list(self.zones) if zones is None else zones):
+                nodes = [record for record, _ in self.zones.get(zone, {}).values()]
+                if not nodes:
+                    if zone not in self._vacated:
+                        continue
+                    # Se parte del último registro del último nodo (conserva 'tiempo' y 'dia' del nodo).
+                    # La plantilla se descarta en forward, cuando el registro ya se reenvió
+                    record = dict(self._vacated[zone])
+                    record.pop("confianza", None)
+                    record.update({"zona": zone, "cantidad": 0, "flag": 1, "nodos": 0})
+                    records.append(record)
+                    continue
+                # Se parte del registro más reciente (conserva 'tiempo' y 'dia')
+                record = dict(max(nodes, key=lambda r: r["tiempo"]))
+                record.pop("confianza", None)
+                record["zona"] = zone
+                record["cantidad"] = sum(r["cantidad"] for r in nodes)
+                record["flag"] = max(r.get("flag", 0) for r in nodes)
+                record["nodos"] = len(nodes)
+                records.append(record)
+        return records
+
+    def _expire(self):
+        """
+        Saca de las zonas los nodos sin datos recientes y marca esas zonas para
+        reenviarlas. También olvida las sesiones sin lotes recientes, cada
+        reinicio de un nodo abre una sesión nueva.
+        """
+        limit = time.monotonic() - self.stale_after
+        for key in [key for key, entry in self._seen.items() if entry[3] < limit]:
+            del self._seen[key]
+        for zone, nodes in self.zones.items():
+            stale = [node for node, (_, received) in nodes.items() if received < limit]
+            for node in stale:
+                if len(nodes) == 1:
+                    self._vacated[zone] = nodes[node][0]
+                del nodes[node]
+                print(f"Nodo {node} sin datos hace más de {self.stale_after:.0f} s, se saca de la zona {zone}.")
+            if stale:
+                self.stats["nodos_vencidos"] += len(stale)
+                self._dirty.add(zone)
+
+    def forward(self):
+        """Reenvía hacia arriba las zonas con datos nuevos o con nodos vencidos."""
+        with self._lock:
+            self._expire()
+            dirty, self._dirty = self._dirty, set()
+        if not dirty or self.upstream_url is None:
+            return 0
+
+        records = self.consolidate(dirty)
+        try:
+            if self.upstream_format == "lote":
+                response = self._session.post(self.upstream_url, data=_encode({"registros": records}), timeout=10,
+                                              headers={"Content-Type": "application/json", "Content-Encoding": "gzip"})
+                response.raise_for_status()
+            else:
+                for record in records:
+                    response = self._session.post(self.upstream_url, data=json.dumps(record), timeout=10,
+                                                  headers={"Content-Type": "application/json"})
+                    response.raise_for_status()
+        except requests.RequestException as error:
+            print(f"Error reenviando al upstream: {error}")
+            with self._lock:
+                self.stats["errores_upstream"] += 1
+                self._dirty |= dirty  # Se reintenta en el próximo ciclo
+            return 0
+
+        with self._lock:
+            self.stats["reenviados"] += len(records)
+            for record in records:
+                zone = record["zona"]
+                if record["nodos"] == 0 and not self.zones.get(zone):
+                    # La zona vacía ya se informó, se deja de reenviar
+                    self._vacated.pop(zone, None)
+                    self.zones.pop(zone, None)
+        return len(records)
+
+    def _forward_loop(self):
+        """Loop del hilo de reenvío."""
+        while not self._stop.wait(self.forward_interval):
+            self.forward()
+        self.forward()
+
+    def start(self):
+        """Inicia el servidor y el reenvío en hilos de fondo."""
+        self._forwarder.start()
+        threading.Thread(target=self.serve_forever, name="Aggregator", daemon=True).start()
+
+    def stop(self):
+        """Detiene el servidor y hace un último reenvío."""
+        self.shutdown()
+        self._stop.set()
+        self._forwarder.join(timeout=10)
+        self.server_close()
+        self._session.close()
+
+
+class NodeClient:
+    """
+    Cliente de un nodo de borde: acumula registros y los envía comprimidos en
+    lotes al agregador sobre una conexión keep-alive. Un lote que falla se
+    reintenta con la misma secuencia, así el agregador descarta los repetidos.
+    """
+    def __init__(self, url, node_id, batch_size=10, timeout=10, max_pending=5000):
+        """
+        Args:
+            url (str): URL del agregador
+            node_id (str): Identificador del nodo
+            batch_size (int): Registros por lote
+            timeout (float): Timeout de cada POST en segundos
+            max_pending (int): Registros que se guardan mientras el agregador no
+                responde, los más antiguos se descartan
+        """
+        self.url = url
+        self.node_id = str(node_id)
+        self.session_id = uuid.uuid4().hex  # La secuencia parte de nuevo en cada ejecución
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.sequence = 0
+        self.dropped = 0  # Registros descartados por exceder max_pending
+        self._pending = []
+        self._unsent = None  # Lote que falló, se reintenta antes de armar otro
+        self._last_sent = None  # Último lote enviado
+        self._session = requests.Session()
+
+    def send(self, record):
+        """
+        Agrega un registro y envía el lote si está completo.
+
+        Args:
+            record (dict): Registro como el que arma send_data
+
+        Returns:
+            bool: True si se envió un lote
+        """
+        self._pending.append(record)
+        excess = len(self._pending) - self.max_pending
+        if excess > 0:
+            del self._pending[:excess]
+            self.dropped += excess
+        if len(self._pending) >= self.batch_size:
+            return self.flush()
+        return False
+
+    def flush(self):
+        """Envía un lote: el fallido anterior si hay, o hasta batch_size registros pendientes."""
+        if self._unsent is None:
+            if not self._pending:
+                return False
+            self.sequence += 1
+            self._unsent = {"nodo": self.node_id, "sesion": self.session_id,
+                            "secuencia": self.sequence, "registros": self._pending[:self.batch_size]}
+            self._pending = self._pending[self.batch_size:]
+        try:
+            response = self._session.post(self.url, data=_encode(self._unsent), timeout=self.timeout,
+                                          headers={"Content-Type": "application/json", "Content-Encoding": "gzip"})
+            response.raise_for_status()
+        except requests.RequestException as error:
+            print(f"Error enviando el lote {self._unsent['secuencia']} al agregador: {error}")
+            return False
+        self._last_sent, self._unsent = self._unsent, None
+        return True
+
+    def close(self):
+        """Envía todos los lotes pendientes, mientras el agregador responda, y cierra la conexión."""
+        while self._unsent is not None or self._pending:
+            if not self.flush():
+                break
+        lost = len(self._pending) + (len(self._unsent["registros"]) if self._unsent is not None else 0)
+        if lost or self.dropped:
+            print(f"Nodo {self.node_id}: {lost} registros sin enviar al cerrar, {self.dropped} descartados por cola llena.")
+        self._session.close()
+
+
+class _UpstreamStub(ThreadingHTTPServer):
+    """Upstream local de prueba que solo cuenta lo que recibe."""
+    daemon_threads = True
+
+    def __init__(self, port):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.received = 0
+        self._lock = threading.Lock()
+
+    def handle_payload(self, payload):
+        with self._lock:
+            self.received += len(payload["registros"]) if "registros" in payload else 1
+        return {"estado": "ok"}
+
+
+def load_test(nodes=300, duration=30.0, period=1.0, batch_size=5, zones=20, port=8080,
+              upstream_port=8081, duplicate_ratio=0.05):
+    """
+    Simula muchos nodos contra un agregador y un upstream locales.
+
+    Args:
+        nodes (int): Nodos simulados
+        duration (float): Segundos de la prueba
+        period (float): Segundos entre conteos de cada nodo (acelerado respecto a producción)
+        batch_size (int): Registros por lote de cada nodo
+        zones (int): Zonas entre las que se reparten los nodos
+        port (int): Puerto del agregador
+        upstream_port (int): Puerto del upstream de prueba
+        duplicate_ratio (float): Fracción de lotes que se reenvían repetidos
+
+    Returns:
+        dict: Resultados de la prueba
+    """
+    import random
+
+    upstream = _UpstreamStub(upstream_port)
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    aggregator = Aggregator("127.0.0.1", port, f"http://127.0.0.1:{upstream_port}/", forward_interval=1.0,
+                            upstream_format="lote")
+    aggregator.start()
+
+    url = f"http://127.0.0.1:{port}/lote"
+    latencies = []
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def node(i):
+        client = NodeClient(url, f"nodo-{i}", batch_size=batch_size)
+        zone = i % zones
+        # Los nodos parten desfasados para no llegar todos juntos
+        stop.wait(random.random() * period)
+        while not stop.is_set():
+            record = {"zona": zone, "cantidad": random.randint(0, 30),
+                      "tiempo": time.strftime("%Y-%m-%d %H:%M:%S"), "flag": 0}
+            start = time.perf_counter()
+            if client.send(record):
+                elapsed = time.perf_counter() - start
+                if random.random() < duplicate_ratio:
+                    # Se reenvía el mismo lote, como haría un nodo tras un timeout
+                    client._unsent = client._last_sent
+                    client.flush()
+                with lock:
+                    latencies.append(elapsed)
+            stop.wait(period)
+        client.close()
+
+    print(f"Prueba de carga: {nodes} nodos durante {duration:.0f} s")
+    threads = [threading.Thread(target=node, args=(i,), daemon=True) for i in range(nodes)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=30)
+    elapsed = time.perf_counter() - start
+    aggregator.stop()
+    upstream.shutdown()
+    upstream.server_close()
+
+    latencies.sort()
+    results = dict(aggregator.stats)
+    results.update({
+        "lotes_por_segundo": results["lotes"] / elapsed,
+        "latencia_p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else None,
+        "latencia_p95_ms": latencies[int(len(latencies) * 0.95)] * 1000 if latencies else None,
+        "recibidos_upstream": upstream.received
+    })
+    for name, value in results.items():
+        print(f"  {name}: {value:.2f}" if isinstance(value, float) else f"  {name}: {value}")
+    return results
+
+
+def main():
+    """Punto de entrada de la línea de comandos."""
+    parser = argparse.ArgumentParser(description="Agregador local de conteos de nodos remotos.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--puerto", type=int, default=8080)
+    parser.add_argument("--upstream", default=None, help="URL a la que se reenvían los conteos consolidados")
+    parser.add_argument("--intervalo", type=float, default=5.0, help="Segundos entre reenvíos")
+    parser.add_argument("--formato-upstream", default="registro", choices=["registro", "lote"])
+    parser.add_argument("--prueba-carga", type=int, default=0, metavar="NODOS",
+                        help="Simula NODOS nodos contra un upstream local en vez de servir")
+    parser.add_argument("--duracion", type=float, default=30.0, help="Segundos de la prueba de carga")
+    parser.add_argument("--periodo", type=float, default=1.0, help="Segundos entre conteos de cada nodo simulado")
+    args = parser.parse_args()
+
+    if args.prueba_carga:
+        load_test(nodes=args.prueba_carga, duration=args.duracion, period=args.periodo, port=args.puerto,
+                  upstream_port=args.puerto + 1)
+        return
+
+    aggregator = Aggregator(args.host, args.puerto, args.upstream, args.intervalo, args.formato_upstream)
+    aggregator.start()
+    print(f"Agregador escuchando en {args.host}:{args.puerto}")
+    try:
+        while True:
+            time.sleep(60)
+            print(f"Estado: {aggregator.stats}")
+    except KeyboardInterrupt:
+        print("Deteniendo el agregador.")
+        aggregator.stop()
+
+
+if __name__ == "__main__":
+    main()
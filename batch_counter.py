@@ -0,0 +1,311 @@
+"""
+Conteo offline por lotes sobre archivos de imagenes.
+
+Recorre un directorio o un patron glob de imagenes, las decodifica en un pool
+de hilos con prefetch y las cuenta en lotes sobre un unico modelo ya cargado
+(o repartidas en un pool de procesos, cada uno con su modelo). Los resultados
+se agregan a un CSV que sirve a la vez de checkpoint: si la corrida se
+interrumpe, al volver a lanzarla se saltan las imagenes ya contadas y se
+reintentan las que fallaron; al terminar queda una sola fila por imagen. Si
+la salida termina en .parquet (requiere pyarrow), al final el CSV parcial se
+convierte a Parquet.
+
+Uso:
+    python batch_counter.py "Archivo/**/*.jpg" conteos.csv --modo ROI --lote 16
+    python batch_counter.py Archivo/ conteos.parquet --procesos 4
+"""
+import os
+import csv
+import glob
+import time
+import argparse
+from itertools import islice
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from cv2 import imread
+
+from Counter import count_images, load_model
+from ROI_extractor import dividir_imagen
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+COLUMNS = ["ruta", "cantidad", "modo", "confianza", "modelo", "fecha_archivo", "error"]
+
+
+def list_images(entrada: str):
+    """
+    Lista las imagenes de un directorio (recursivo) o de un patron glob.
+
+    Args:
+        entrada (str): Directorio o patron glob
+
+    Returns:
+        list: Rutas de las imagenes ordenadas
+    """
+    if os.path.isdir(entrada):
+        rutas = glob.glob(os.path.join(entrada, "**", "*"), recursive=True)
+    else:
+        rutas = glob.glob(entrada, recursive=True)
+    return sorted(ruta for ruta in rutas if ruta.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def repair_checkpoint(csv_path: str):
+    """
+    Descarta la última línea del CSV si quedó a medias (la corrida anterior se
+    cortó mientras escribía), para que no se lea como una fila terminada ni
+    se le peguen las filas de la próxima corrida.
+
+    Args:
+        csv_path (str): Ruta del CSV de resultados
+    """
+    if not os.path.exists(csv_path):
+        return
+    with open(csv_path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - 65536)
+            f.seek(start)
+            chunk = f.read(position - start)
+            newline = chunk.rfind(b"\n")
+            if newline != -1:
+                position = start + newline + 1
+                break
+            position = start
+        if position < end:
+            f.truncate(position)
+            print(f"Se descartó una fila incompleta al final de {csv_path}.")
+
+
+def load_checkpoint(csv_path: str):
+    """
+    Lee las rutas ya procesadas de un CSV de resultados anterior.
+
+    Args:
+        csv_path (str): Ruta del CSV de resultados
+
+    Returns:
+        set: Rutas ya contadas sin error
+    """
+    if not os.path.exists(csv_path):
+        return set()
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        return {row["ruta"] for row in csv.DictReader(f) if not row["error"]}
+
+
+def compact_results(csv_path: str):
+    """
+    Deja una sola fila por imagen en el CSV de resultados: la última sin
+    error si la hay, o la última con error si todas fallaron.
+
+    Args:
+        csv_path (str): Ruta del CSV de resultados
+    """
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        filas = list(csv.DictReader(f))
+    mejores = {}  # Conserva el orden de la primera aparición de cada ruta
+    for fila in filas:
+        anterior = mejores.get(fila["ruta"])
+        if anterior is None or not fila["error"] or anterior["error"]:
+            mejores[fila["ruta"]] = fila
+    if len(mejores) == len(filas):
+        return
+
+    tmp_path = csv_path + ".tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(mejores.values())
+    os.replace(tmp_path, csv_path)
+    print(f"Se descartaron {len(filas) - len(mejores)} filas reemplazadas por un reintento.")
+
+
+def decode(ruta: str, modo: str):
+    """
+    Lee una imagen y, en modo ROI, extrae sus regiones en memoria.
+
+    Args:
+        ruta (str): Ruta de la imagen
+        modo (str): 'normal' o 'ROI'
+
+    Returns:
+        tuple: (ruta, lista de imagenes a contar o None si no se pudo leer)
+    """
+    imagen = imread(ruta)
+    if imagen is None:
+        return ruta, None
+    if modo == "ROI":
+        return ruta, dividir_imagen(imagen)
+    return ruta, [imagen]
+
+
+def prefetch_batches(rutas: list, modo: str, hilos: int, tamano_lote: int):
+    """
+    Decodifica las imagenes en un pool de hilos manteniendo hasta dos lotes
+    adelantados, para que el modelo no espere por el disco.
+
+    Args:
+        rutas (list): Rutas de las imagenes
+        modo (str): 'normal' o 'ROI'
+        hilos (int): Hilos de decodificación
+        tamano_lote (int): Imagenes por lote
+
+    Yields:
+        list: Lote de tuplas (ruta, imagenes)
+    """
+    with ThreadPoolExecutor(max_workers=hilos) as pool:
+        pendientes = deque(pool.submit(decode, ruta, modo) for ruta in islice(iter(rutas), 2 * tamano_lote))
+        siguientes = islice(iter(rutas), 2 * tamano_lote, None)
+        lote = []
+        while pendientes:
+            lote.append(pendientes.popleft().result())
+            ruta = next(siguientes, None)
+            if ruta is not None:
+                pendientes.append(pool.submit(decode, ruta, modo))
+            if len(lote) == tamano_lote:
+                yield lote
+                lote = []
+        if lote:
+            yield lote
+
+
+def count_batch(lote: list, conf: float, weight: str):
+    """
+    Cuenta un lote de imagenes en una sola llamada al modelo, sumando las ROI
+    de cada imagen.
+
+    Args:
+        lote (list): Tuplas (ruta, imagenes) entregadas por decode
+        conf (float): Confianza del modelo
+        weight (str): Peso del modelo YOLO
+
+    Returns:
+        list: Tuplas (ruta, cantidad o None si no se pudo leer)
+    """
+    imagenes, duenos = [], []
+    for i, (_, tiles) in enumerate(lote):
+        for tile in tiles or []:
+            imagenes.append(tile)
+            duenos.append(i)
+
+    totales = [0] * len(lote)
+    for i, cantidad in zip(duenos, count_images(imagenes, conf, weight)):
+        totales[i] += cantidad
+    return [(ruta, totales[i] if tiles is not None else None) for i, (ruta, tiles) in enumerate(lote)]
+
+
+def _init_worker(weight: str, hilos_torch: int):
+    """Inicializa un proceso del pool con su modelo ya cargado."""
+    import torch
+    torch.set_num_threads(hilos_torch)
+    load_model(weight)
+
+
+def _count_paths(rutas: list, modo: str, conf: float, weight: str, hilos: int):
+    """Decodifica y cuenta un lote de rutas dentro de un proceso del pool."""
+    with ThreadPoolExecutor(max_workers=hilos) as pool:
+        lote = list(pool.map(lambda ruta: decode(ruta, modo), rutas))
+    return count_batch(lote, conf, weight)
+
+
+def run_batch(entrada: str, salida: str, modo: str = "normal", conf: float = 0.2,
+              weight: str = "yolov8x.pt", tamano_lote: int = 16, hilos: int = 4, procesos: int = 1):
+    """
+    Cuenta todas las imagenes de la entrada y escribe los resultados, retomando
+    desde el checkpoint si existe.
+
+    Args:
+        entrada (str): Directorio o patron glob de imagenes
+        salida (str): Archivo de resultados, .csv o .parquet
+        modo (str): 'normal' o 'ROI'
+        conf (float): Confianza del modelo
+        weight (str): Peso del modelo YOLO
+        tamano_lote (int): Imagenes por llamada al modelo
+        hilos (int): Hilos de decodificación
+        procesos (int): Procesos de inferencia, con 1 se usa un solo modelo en este proceso
+
+    Returns:
+        int: Cantidad de imagenes contadas en esta corrida
+    """
+    parquet = salida.lower().endswith(".parquet")
+    csv_path = salida + ".parcial.csv" if parquet else salida
+    if parquet:
+        # Se revisa antes de contar, no al final de una corrida larga
+        from importlib.util import find_spec
+        if find_spec("pyarrow") is None and find_spec("fastparquet") is None:
+            raise SystemExit("La salida .parquet requiere pyarrow (pip install pyarrow) o fastparquet.")
+
+    rutas = list_images(entrada)
+    repair_checkpoint(csv_path)
+    hechas = load_checkpoint(csv_path)
+    pendientes = [ruta for ruta in rutas if ruta not in hechas]
+    print(f"Imagenes: {len(rutas)} ({len(hechas)} ya contadas, {len(pendientes)} pendientes)")
+
+    nuevo = not os.path.exists(csv_path) or os.path.getsize(csv_path) == 0
+    contadas = 0
+    inicio = time.perf_counter()
+    with open(csv_path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if nuevo:
+            writer.writerow(COLUMNS)
+
+        def escribir(resultados):
+            nonlocal contadas
+            for ruta, cantidad in resultados:
+                fecha = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(os.path.getmtime(ruta)))
+                error = "" if cantidad is not None else "lectura"
+                writer.writerow([ruta, cantidad if cantidad is not None else "", modo, conf, weight, fecha, error])
+            # Se vacia el archivo en cada lote para que sirva de checkpoint
+            f.flush()
+            contadas += len(resultados)
+            velocidad = contadas / (time.perf_counter() - inicio)
+            print(f"{contadas}/{len(pendientes)} imagenes ({velocidad:.1f} img/s)")
+
+        if procesos <= 1:
+            load_model(weight)
+            for lote in prefetch_batches(pendientes, modo, hilos, tamano_lote):
+                escribir(count_batch(lote, conf, weight))
+        else:
+            hilos_torch = max(1, (os.cpu_count() or procesos) // procesos)
+            lotes = (pendientes[i:i + tamano_lote] for i in range(0, len(pendientes), tamano_lote))
+            with ProcessPoolExecutor(max_workers=procesos, initializer=_init_worker,
+                                     initargs=(weight, hilos_torch)) as pool:
+                en_curso = set()
+                for lote in lotes:
+                    en_curso.add(pool.submit(_count_paths, lote, modo, conf, weight, hilos))
+                    if len(en_curso) >= 2 * procesos:
+                        listos, en_curso = wait(en_curso, return_when=FIRST_COMPLETED)
+                        for futuro in listos:
+                            escribir(futuro.result())
+                for futuro in en_curso:
+                    escribir(futuro.result())
+
+    compact_results(csv_path)
+
+    if parquet:
+        import pandas as pd
+        pd.read_csv(csv_path).to_parquet(salida, index=False)
+        os.remove(csv_path)
+        print(f"Resultados guardados en {salida}")
+
+    return contadas
+
+
+def main():
+    """Punto de entrada de la línea de comandos."""
+    parser = argparse.ArgumentParser(description="Conteo de personas por lotes sobre archivos de imagenes.")
+    parser.add_argument("entrada", help="Directorio o patron glob de imagenes")
+    parser.add_argument("salida", help="Archivo de resultados (.csv o .parquet)")
+    parser.add_argument("--modo", default="normal", choices=["normal", "ROI"])
+    parser.add_argument("--conf", type=float, default=0.2, help="Confianza del modelo")
+    parser.add_argument("--modelo", default="yolov8x.pt", help="Peso del modelo YOLO")
+    parser.add_argument("--lote", type=int, default=16, help="Imagenes por llamada al modelo")
+    parser.add_argument("--hilos", type=int, default=4, help="Hilos de decodificación")
+    parser.add_argument("--procesos", type=int, default=1, help="Procesos de inferencia")
+    args = parser.parse_args()
+
+    run_batch(args.entrada, args.salida, args.modo, args.conf, args.modelo,
+              args.lote, args.hilos, args.procesos)
+
+
+if __name__ == "__main__":
+    main()
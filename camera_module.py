@@ -1,29 +1,114 @@
 import os
+import json
 import time
+import threading
 import cv2
 from image_metrics import ImageMetrics
+from video_source import open_source
 
 
 class CameraModule:
-    """Clase para gestionar la cámara y procesar las imágenes capturadas."""
-    def __init__(self, max_photos=100, camera_index=0, photo_directory="CameraModule_Log", capture_period=10, num_images_to_analyze=10):
+    """
+    Clase para gestionar la cámara y procesar las imágenes capturadas.
+
+    El estado compartido entre el hilo de captura y el resto del programa
+    (flag de captura, última foto publicada, métricas) se protege con un lock.
+    Detener la captura activa un evento que despierta de inmediato las esperas
+    del hilo de captura, y close_camera se puede llamar varias veces y desde
+    cualquier hilo.
+    """
+    def __init__(self, max_photos=100, camera_index=0, photo_directory="CameraModule_Log", capture_period=10, num_images_to_analyze=10, source=None, source_options=None, latest_frame=False, archive=None):
+        """
+        Args:
+            source (int, str or FrameSource): Fuente de frames, puede ser un índice de cámara,
+                un archivo de video o la URL de un stream. Si es None se usa camera_index
+            source_options (dict): Opciones de la fuente (every_n, every_seconds, latest_only, ...)
+            latest_frame (bool): Usar un hilo que hace grab() continuo sobre la cámara para que
+                cada captura entregue el frame más nuevo y no uno encolado
+            archive (FrameArchive): Si se entrega, las fotos se escriben y archivan en un hilo de fondo
+        """
+        self._lock = threading.RLock()  # Protege el estado compartido con el hilo de captura
+        self._stop = threading.Event()  # Se activa al detener la captura, despierta las esperas
+        self._capture_thread = None  # Hilo que está corriendo capture(), si hay uno
+        self._closed = False  # La cámara ya se cerró
+        self._latest = None  # (número, ruta, tiempo) de la última foto escrita a disco
         self.capturing = False  # Flag para saber si está capturando o no
         self.photo_count = 0  # Contador de fotos tomadas
         self.max_photos = max_photos  # Máximo de fotos que se pueden tomar
         self.photo_format = ".jpg"
         self.photo_directory = photo_directory
         self.camera_index = camera_index  # Índice de la cámara
+        source_options = dict(source_options or {})
+        if latest_frame:
+            source_options['latest_only'] = True
+        self.source = open_source(camera_index if source is None else source, **source_options)  # Fuente de los frames
+        self.cap = self.source
+        self.archive = archive  # Archivo de frames en segundo plano
         self.capture_period = capture_period  # Tiempo entre capturas
         self.num_images_to_analyze = num_images_to_analyze  # Número de imágenes a analizar
+        self.photo_metrics = {}  # Métricas de cada foto guardada, por ruta
+        self._last_metrics = None  # Métricas del último frame evaluado
+        self.baseline = None  # Media y desviación de las métricas de las últimas fotos
+        self._cached_baseline = None  # Baseline de la corrida anterior, se usa en la primera comparación
+        self._reference = None  # Ruta, mtime y métricas de la imagen de referencia
+        self.start_cache_path = os.path.join(photo_directory, "start_cache.json")
+        self.init_timings = {}  # Tiempos de la inicialización en segundos
 
         # Crear directorio para las fotos si no existe
         if not os.path.exists(self.photo_directory):
             os.makedirs(self.photo_directory)
 
+    @property
+    def capturing(self):
+        """Flag de captura. Ponerlo en False detiene la captura y despierta sus esperas."""
+        with self._lock:
+            return not self._stop.is_set()
+
+    @capturing.setter
+    def capturing(self, value):
+        with self._lock:
+            if value:
+                self._stop.clear()
+            else:
+                self._stop.set()
+
     def get_capturing(self):
         """Retorna el estado de captura."""
         return self.capturing
 
+    def stop(self):
+        """Detiene la captura. El hilo de captura sale de su espera y cierra la cámara."""
+        self.capturing = False
+
+    def wait(self, seconds):
+        """
+        Espera hasta seconds segundos o hasta que se detenga la captura.
+
+        Returns:
+            bool: True si se detuvo la captura
+        """
+        return self._stop.wait(seconds)
+
+    def latest_photo(self):
+        """
+        Retorna la última foto escrita a disco, leída de forma atómica.
+
+        Returns:
+            tuple: (número de la foto, ruta, tiempo en que se escribió), o None si aún no hay fotos
+        """
+        with self._lock:
+            return self._latest
+
+    def _publish(self, photo_number, photo_path):
+        """Publica una foto ya escrita a disco como la última disponible."""
+        with self._lock:
+            self._latest = (photo_number, photo_path, time.time())
+
+    def get_photo_metrics(self, photo_path):
+        """Retorna las métricas ya calculadas de una foto guardada, o None si no se tienen."""
+        with self._lock:
+            return self.photo_metrics.get(photo_path)
+
     # directory methods
 
     def _generate_photo_path(self, photo_number):
@@ -48,8 +133,22 @@ class CameraModule:
     def save_photo(self, photo_number, frame):
         """Captura y guarda una foto."""
         photo_path = self._generate_photo_path(photo_number)
-        cv2.imwrite(photo_path, frame)
-        print(f"Photo {photo_path} saved.")
+        with self._lock:
+            self.photo_metrics[photo_path] = self._last_metrics
+        if self.archive is not None:
+            # La escritura y la codificación ocurren fuera del hilo de captura,
+            # la foto se publica cuando ya está en disco
+            self.archive.submit(frame, photo_number, working_path=photo_path,
+                                on_saved=lambda: self._publish(photo_number, photo_path))
+        else:
+            # Se escribe a un temporal y se reemplaza, así nadie lee una foto a medias
+            root, ext = os.path.splitext(photo_path)
+            tmp_path = f"{root}.tmp{ext}"
+            cv2.imwrite(tmp_path, frame)
+            os.replace(tmp_path, photo_path)
+            print(f"Photo {photo_path} saved.")
+            self._publish(photo_number, photo_path)
+        self._save_start_cache(next_photo=(photo_number + 1) % self.max_photos)
 
     def delete_photo(self, photo_number):
         """Elimina una foto basada en el número proporcionado."""
@@ -61,18 +160,93 @@ class CameraModule:
             #print("Error eliminando la foto.")
             #self._handle_error(error_type='delete_error')
             pass # Si no existe la foto no se hace nada
+
+    # start cache methods
+
+    def _load_start_cache(self, reference_path):
+        """Carga el cache de inicio si corresponde a la misma cámara y a la misma versión de la imagen de referencia."""
+        try:
+            with open(self.start_cache_path) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if cache.get('camera') != repr(self.source):
+            return None
+        reference = cache.get('reference', {})
+        if reference.get('path') != reference_path or reference.get('mtime') != os.path.getmtime(reference_path):
+            return None
+        return cache
+
+    def _save_start_cache(self, next_photo):
+        """Guarda las métricas de referencia, el baseline y el número de la próxima foto para el próximo inicio."""
+        if self._reference is None:
+            return
+        cache = {
+            'camera': repr(self.source),
+            'reference': self._reference,
+            'baseline': self.baseline,
+            'photo_count': next_photo
+        }
+        # Se escribe a un archivo temporal y se reemplaza para no dejar el cache a medias
+        tmp_path = self.start_cache_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, self.start_cache_path)
+
+    def print_init_timings(self):
+        """Imprime los tiempos de la inicialización."""
+        print(f" ------------------------- Tiempos de inicialización -------------------------")
+        for step, seconds in self.init_timings.items():
+            print(f"  {step}: {seconds:.3f} s")
+        print(f"-----------------------------------------------------------------------------\n")
+
     # capture methods
 
-    def initialize(self, numero_fotos_inicial = 10, initial_photo_period=1, max_retries=3, attemp_interval=0.25):
-        """Inicializa el módulo de la cámara."""
+    def _open(self):
+        """Abre la fuente si no quedó abierta. Retorna False si no se pudo abrir."""
+        self.cap = self.source
+        if not self.cap.isOpened() and not self.cap.open():
+            return False
+        with self._lock:
+            self._closed = False
+        return True
+
+    def initialize(self, numero_fotos_inicial = 10, initial_photo_period=1, max_retries=3, attemp_interval=0.25, fast_start=False):
+        """Inicializa el módulo de la cámara.
+
+        Args:
+            fast_start (bool): Si existe un cache de inicio válido (misma cámara y misma imagen de referencia),
+                se reutilizan las métricas de referencia, el baseline y las fotos de la corrida anterior y se
+                toma una sola foto en vez de las fotos iniciales.
+        """
+        start = time.perf_counter()
+        self.init_timings = {}
+
+        test_image_path = f"test.jpg"
+        cache = self._load_start_cache(test_image_path)
+        if fast_start and cache is not None and cache.get('baseline'):
+            start_error = self._fast_initialize(cache, max_retries, attemp_interval)
+            self.init_timings['total'] = time.perf_counter() - start
+            if not start_error:
+                return start_error
+            print("Inicio rápido fallido, se hace la inicialización completa.")
+            start = time.perf_counter()
 
         # eliminar las fotos del directorio
         for i in range(self.max_photos):
             self.delete_photo(i)
+        self.photo_count = 0
+        self.init_timings['borrado_fotos'] = time.perf_counter() - start
 
         # cargar las metricas de la imagen de referencia
-        test_image_path = f"test.jpg"
-        test_metrics = ImageMetrics.get_metrics(test_image_path)
+        t = time.perf_counter()
+        if cache is not None:
+            test_metrics = cache['reference']['metrics']
+        else:
+            test_metrics = {name: float(value) for name, value in ImageMetrics.get_metrics(test_image_path).items()}
+        self._reference = {'path': test_image_path, 'mtime': os.path.getmtime(test_image_path), 'metrics': test_metrics}
+        self.init_timings['metricas_referencia'] = time.perf_counter() - t
 
         print(f" ------------------------- Métricas imagen de prueba -------------------------")
         print(f"  Métricas de la imagen de prueba: ")
@@ -80,12 +254,14 @@ class CameraModule:
         print(f"-----------------------------------------------------------------------------\n")
 
         # Se abre la cámara
+        t = time.perf_counter()
         start_error = False # Flag para saber si hubo un error al inicializar el módulo
-        self.cap = cv2.VideoCapture(self.camera_index)
-        if not self.cap.isOpened():
+        if not self._open():
             self._handle_error('capture_error')
             start_error = True
             return start_error
+        self.init_timings['apertura_camara'] = time.perf_counter() - t
+        t = time.perf_counter()
 
         # Se toman las fotos iniciales
         for i in range(numero_fotos_inicial):
@@ -126,11 +302,44 @@ class CameraModule:
                 # Se espera el tiempo de captura
                 time.sleep(initial_photo_period)
 
-        # Se cierra la cámara
-        self.close_camera()
+        self.init_timings['fotos_iniciales'] = time.perf_counter() - t
+        self.init_timings['total'] = time.perf_counter() - start
+
+        # La cámara queda abierta para capture(), reabrirla toma segundos.
+        # Solo se cierra si hubo un error.
+        if start_error:
+            self.close_camera()
 
         return start_error
 
+    def _fast_initialize(self, cache, max_retries=3, attemp_interval=0.25):
+        """Inicializa reutilizando el cache de la corrida anterior, tomando una sola foto."""
+        self._reference = cache['reference']
+        self._cached_baseline = cache['baseline']
+        self.baseline = cache['baseline']
+        self.photo_count = cache['photo_count'] % self.max_photos
+        print(f"Inicio rápido: se reutiliza el baseline de la corrida anterior (foto {self.photo_count}).")
+
+        t = time.perf_counter()
+        if not self._open():
+            self._handle_error('open_error')
+            return True
+        self.init_timings['apertura_camara'] = time.perf_counter() - t
+
+        # Se toma una foto y se compara con el baseline guardado
+        t = time.perf_counter()
+        for attempt in range(max_retries):
+            ret, frame = self.cap.read()
+            if ret and not self.compare_image(frame):
+                self.save_photo(self.photo_count, frame)
+                self.photo_count = (self.photo_count + 1) % self.max_photos
+                self.init_timings['primera_foto'] = time.perf_counter() - t
+                return False
+            time.sleep(attemp_interval)
+
+        self._cached_baseline = None
+        return True
+
     def capture(self, max_retries=3, retry_delay=5, attemp_interval=1):
         """Comienza la captura de fotos en intervalos definidos por capture_period.
         
@@ -139,11 +348,23 @@ class CameraModule:
             retry_delay (int): Delay entre intentos de captura.
         """
 
-        self.cap = cv2.VideoCapture(self.camera_index)
-        if not self.cap.isOpened():
+        # Si la cámara quedó abierta desde initialize() se sigue usando
+        if not self._open():
             self._handle_error('open_error')
             return
 
+        with self._lock:
+            self._capture_thread = threading.current_thread()
+        try:
+            self._capture_loop(max_retries, retry_delay, attemp_interval)
+        finally:
+            with self._lock:
+                self._capture_thread = None
+            # Se cierra la cámara
+            self.close_camera()
+
+    def _capture_loop(self, max_retries, retry_delay, attemp_interval):
+        """Loop de captura, corre hasta que se detenga la captura."""
         while self.capturing:
             error_detected = False
             # Capturar la foto
@@ -163,39 +384,59 @@ class CameraModule:
     
                     if not ret:
                         self._handle_error(error_type='capture_error')
-                        time.sleep(attemp_interval)
+                        if self.wait(attemp_interval):
+                            return
                 
                     if not self.compare_image(frame):
                         break # La imagen es buena y podemos salir
                     
-                    time.sleep(attemp_interval)
+                    if self.wait(attemp_interval):
+                        return
 
                     if attempt == max_retries - 1:
                         error_detected = True
                         self._handle_error(error_type='corrupt_flag')
         
             if error_detected:
-                time.sleep(retry_delay)
+                self.wait(retry_delay)
             else:
                 # En caso de que no haya errores se guarda la foto
                 self.save_photo(self.photo_count, frame)
 
                 # Se actualiza el contador de fotos
-                self.photo_count = (self.photo_count + 1) % self.max_photos
+                with self._lock:
+                    self.photo_count = (self.photo_count + 1) % self.max_photos
                 
-                # Se espera el tiempo de captura
-                time.sleep(self.capture_period)
+                # Se espera el tiempo de captura, o menos si se detiene la captura
+                self.wait(self.capture_period)
 
                 error_detected = False
-
-        # Se cierra la cámara
-        self.close_camera()
     
     def close_camera(self):
-        """Cierra la cámara."""
+        """
+        Detiene la captura y cierra la cámara. Se puede llamar más de una vez y
+        desde cualquier hilo: si otro hilo está capturando solo se le avisa, y
+        es ese hilo el que libera la cámara al salir del loop.
+        """
+        with self._lock:
+            self.capturing = False
+            capture_thread = self._capture_thread
+            if self._closed or (capture_thread is not None and capture_thread is not threading.current_thread()):
+                return
+            self._closed = True
         print("Cerrando la cámara.")
-        self.capturing = False
         self.cap.release()
+
+    def close(self):
+        """
+        Cierre final del módulo: cierra la cámara y el archivo de frames.
+
+        close_camera no cierra el archivo para que la cámara se pueda volver a
+        abrir; después de close ya no se archivan ni publican fotos.
+        """
+        self.close_camera()
+        if self.archive is not None:
+            self.archive.close()
         
     
     def compare_to_reference(self, test_frame, reference_image_metrics):
@@ -207,6 +448,7 @@ class CameraModule:
 
         # Se obtienen las metricas de la imagen actual
         actual_image_metrics = ImageMetrics.get_metrics(test_frame, file_path=False)
+        self._last_metrics = actual_image_metrics
         print(f" ------------------------- Métricas de la imagen actual -------------------------")
         self.print_metrics(actual_image_metrics)
         print(f"---------------------------------------------------------------------------------\n")
@@ -271,12 +513,20 @@ class CameraModule:
         """Evalúa las métricas de la última imagen capturada y las compara con las de las imágenes anteriores."""
         
         actual_image_metrics = ImageMetrics.get_metrics(frame, file_path=False)
+        self._last_metrics = actual_image_metrics
         #print(f" ------------------------- Evaluando imagen actual -------------------------")
         #print(f"  Métricas de la última imagen:")
         #self.print_metrics(actual_image_metrics)
         #print(f"-----------------------------------------------------------------------------\n")
 
-        last_images_metrics = self._evaluate_last_images_metrics()
+        if self._cached_baseline is not None:
+            # Primera comparación de un inicio rápido, no se releen las fotos del disco
+            last_images_metrics = self._cached_baseline
+            self._cached_baseline = None
+        else:
+            last_images_metrics = self._evaluate_last_images_metrics()
+        self.baseline = {name: {'mean': float(results['mean']), 'std': float(results['std'])}
+                         for name, results in last_images_metrics.items()}
               
         print(f" ------------------------- Evaluacion de la imagen comparada a las demas -------------------------")
         corrupt_flag = False
@@ -1,11 +1,20 @@
+from time import perf_counter
+_import_start = perf_counter()
 from camera_module import CameraModule
 import json
 import requests
 from pytz import timezone
 from datetime import datetime
-from Counter import Runner
+from Counter import Runner, load_times
+from count_tracker import CountTracker
+from frame_cache import FrameCache
+from frame_preprocessor import FramePreprocessor
+from count_store import CountStore
+from aggregator import NodeClient
+from frame_archive import FrameArchive
+from cv2 import imread
 import threading
-from time import sleep
+import_time = perf_counter() - _import_start # torch y ultralytics se importan al cargar el modelo
 
 ## ARGS ##
 
@@ -14,25 +23,87 @@ numero_fotos_inicial = 10
 periodo_captura= 5
 max_retries = 3
 retry_delay = 1
+margen_loop = 1 # Segundos extra que espera el loop principal despues de cada captura
+archivar_frames = True # Escribe las fotos en segundo plano y guarda un archivo comprimido y acotado
+opciones_archivo = {'encoder': '.jpg', 'quality': 70, 'thumbnail_size': 960, 'budget_bytes': 2 * 1024**3}
+inicio_rapido = True # Reutiliza el baseline de la corrida anterior si la camara y test.jpg no cambiaron
+fuente = 0 # Indice de la camara, ruta de un video o URL de un stream (rtsp://...)
+opciones_fuente = {} # Por ejemplo {'every_seconds': 5} para un video grabado
+ultimo_frame = True # Hilo de grab continuo para no leer frames encolados
 
 # Model
 model = 'yolov8x.pt'
 modo = 'normal'
 confidence = 0.2
+tamano_entrada = 'auto' # Tamaño de entrada del modelo: 'auto' (por forma de imagen), un entero o None
+inferencia_paralela = None # None: un modelo en este proceso. 'auto': lo elegido por parallel_inference.py, o {'replicas': 2, 'hilos': 4, 'fijar_nucleos': True}
+guardar_predicciones = False # Guardar cada prediccion en 'Predicciones' crea una carpeta nueva por loop
+
+# Suavizado temporal de los conteos
+suavizado = True
+modo_suavizado = 'kalman' # 'kalman' o 'ema'
+
+# Preprocesamiento condicional segun las metricas del frame
+preprocesar = True
+
+# Cache de frames casi identicos
+usar_cache = True # Si es False siempre se corre el modelo (la deteccion de camara congelada sigue activa)
+capacidad_cache = 32
+edad_maxima_cache = 60 # Segundos que un conteo cacheado se puede reutilizar
+usos_maximos_cache = 5 # Veces que un conteo cacheado se puede reutilizar
+repeticiones_congelada = 12 # Capturas iguales seguidas para avisar camara congelada
+
+# Almacen local de los conteos, permite consultar la afluencia aunque la API no responda
+almacen_local = True
+directorio_almacen = "Afluencia_Store"
 
 # Definicón de la URL de la API
 api_url = "https://dqrqv2q9jg.execute-api.sa-east-1.amazonaws.com/deploy" 
 
+# Agregador local (aggregator.py), si se define los datos se envian en lotes al
+# agregador del sitio en vez de directo a la API
+url_agregador = None # Por ejemplo "http://192.168.1.10:8080/lote"
+id_nodo = "nodo-1"
+tamano_lote = 1
+
 # Obtenemos la zona horaria de Santiago de Chile
 santiago_timezone = timezone('Chile/Continental')
 
 zona = 1 
 
-def send_data(cantidad, flag=0):
-    """Envía los datos a la API."""
+def build_outputs():
+    """
+    Construye los destinos de los conteos con la configuración de este archivo. Se
+    crean en main y no al importar, así importar el módulo (por ejemplo en las
+    replicas de parallel_inference) no abre ni recupera el almacen.
+
+    Returns:
+        tuple: (almacen local o None, cliente del agregador o None, sesión HTTP)
+    """
+    store = CountStore(directorio_almacen) if almacen_local else None
+    cliente_agregador = NodeClient(url_agregador, id_nodo, batch_size=tamano_lote) if url_agregador else None
+    http = requests.Session() # Se reutiliza la conexion en vez de abrir una por envio
+    return store, cliente_agregador, http
+
+def send_data(cantidad, store, cliente_agregador, http, flag=0, confianza=None):
+    """Envía los datos a la API.
+
+    Args:
+        cantidad (int): Cantidad de personas
+        store (CountStore): Almacen local, o None
+        cliente_agregador (NodeClient): Cliente del agregador, o None para enviar directo a la API
+        http (requests.Session): Sesión para los envíos a la API
+        flag (int): Flag del registro (1 = fuera de servicio)
+        confianza (float): Confianza del conteo suavizado, o None
+    """
 
-    tiempo = datetime.now(santiago_timezone).strftime("%Y-%m-%d %H:%M:%S")
-    dia = datetime.now(santiago_timezone).strftime("%A")
+    ahora = datetime.now(santiago_timezone)
+    tiempo = ahora.strftime("%Y-%m-%d %H:%M:%S")
+    dia = ahora.strftime("%A")
+
+    # El registro se guarda localmente antes de enviarlo
+    if store is not None:
+        store.append(zona, ahora, cantidad, flag)
     
     # Datos a enviar en la solicitud POST
     data = {
@@ -42,12 +113,20 @@ def send_data(cantidad, flag=0):
         "dia": dia,
         "flag": flag
     }
+    if confianza is not None:
+        data["confianza"] = confianza
    
     # Convierte los datos a un formato que se pueda enviar
     data_json = json.dumps(data)
 
-    # Envía la solicitud POST
-    response = requests.post(api_url, data=data_json, headers={"Content-Type": "application/json"})
+    # Envía la solicitud POST, o deja el registro en el lote del agregador
+    if cliente_agregador is not None:
+        cliente_agregador.send(data)
+    else:
+        try:
+            response = http.post(api_url, data=data_json, headers={"Content-Type": "application/json"}, timeout=10)
+        except requests.RequestException as error:
+            print(f"Error enviando los datos a la API: {error}")
     
     return data
 
@@ -56,71 +135,161 @@ def run_cam_module(module):
     """Función que corre el módulo de la cámara."""
     global finish_flag
 
-    module.capturing = True
     try:
         module.capture(max_retries=max_retries, retry_delay=retry_delay)
     except KeyboardInterrupt:
         print("Captura interrumpida.")
-        module.close_camera()
     finally:
-        module.close_camera()
+        module.close_camera() # No hace nada si capture() ya la cerró
         
-def main():
-    """Función principal del programa."""
+def build_camera_module():
+    """Construye el módulo de la cámara (fuente, grab continuo y archivo) con la configuración de este archivo."""
+    archive = FrameArchive(**opciones_archivo) if archivar_frames else None
+    return CameraModule(capture_period=periodo_captura, source=fuente, source_options=opciones_fuente,
+                        latest_frame=ultimo_frame, archive=archive)
+
+def main(cam_module=None):
+    """Función principal del programa.
+
+    Args:
+        cam_module (CameraModule): Módulo de cámara ya construido (por ejemplo con una fuente
+            de prueba). Si es None se construye con la configuración de este archivo
+    """
 
     # Inicializar el módulo de la cámara
-    cam_module = CameraModule(capture_period=periodo_captura)
+    if cam_module is None:
+        cam_module = build_camera_module()
     
-    start_error = cam_module.initialize(numero_fotos_inicial = numero_fotos_inicial,initial_photo_period=0.5)
+    start_error = cam_module.initialize(numero_fotos_inicial = numero_fotos_inicial,initial_photo_period=0.5, fast_start=inicio_rapido)
+    print(f"Importaciones: {import_time:.3f} s")
+    cam_module.print_init_timings()
     if start_error:
         print ("-----------------------------\n")
         print("Error inicializando el módulo de la cámara.")
         print ("-----------------------------\n")
+        cam_module.close()
         return
 
-    last_photo_path = cam_module._generate_last_photo_path() # Esta es la ultima foto de la inicialización
+    last_photo = cam_module.latest_photo() # Esta es la ultima foto de la inicialización
+
+    # Almacen local, cliente del agregador y sesión HTTP
+    store, cliente_agregador, http = build_outputs()
 
-    # Iniciar el thread de la cámara
+    # Iniciar el thread de la cámara. El flag se activa antes de partir el
+    # thread para que el loop principal no lo lea todavía apagado
+    cam_module.capturing = True
     thread_cam = threading.Thread(target = run_cam_module, args=(cam_module,))
     thread_cam.start()
     
     error = 0 # contador de errores
 
+    # Etapa temporal que estabiliza los conteos de esta cámara
+    tracker = CountTracker(modo=modo_suavizado) if suavizado else None
+
+    # Cache de conteos por hash perceptual del frame
+    cache = FrameCache(capacidad=capacidad_cache, repeticiones_congelada=repeticiones_congelada,
+                       max_edad=edad_maxima_cache, max_usos=usos_maximos_cache)
+
+    # Mejoramiento de imagen solo para los frames que lo necesitan
+    preprocessor = FramePreprocessor() if preprocesar else None
+
+    # Replicas del modelo en procesos separados, los recortes se reparten entre ellas
+    paralelo = None
+    if inferencia_paralela is not None:
+        from parallel_inference import ParallelCounter
+        paralelo = ParallelCounter.from_config(model, inferencia_paralela, confidence, tamano_entrada, modo)
+
     # loop principal para corre el modelo y enviar los datos
     capturing = cam_module.get_capturing()
 
     try:
         while capturing:
-            sleep(periodo_captura + 1)
-            jpg_path = cam_module._generate_last_photo_path()
+            if cam_module.wait(periodo_captura + margen_loop):
+                break # Se detuvo la captura durante la espera
+            photo = cam_module.latest_photo() # (número, ruta, tiempo), leídos juntos
             
             # En caso que no haya una foto nueva, se salta el resto del loop
             # y en caso de que se repita la misma foto 3 veces, se envía un flag
             # para decir que se esta fuera de servicio
-            if jpg_path == last_photo_path:
+            if photo is None or photo == last_photo:
                 error += 1
                 if error < 3:
                     print("-----------------------------\n")
-                    print("No hay foto nueva a ser analizada, se repite:", jpg_path)
+                    print("No hay foto nueva a ser analizada, se repite:", photo and photo[1])
                     print("-----------------------------\n")
 
                     continue  # Se parte el loop desde el principio
                 else:
-                    print(send_data(0, flag=1))
+                    print(send_data(0, store, cliente_agregador, http, flag=1))
 
                     print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!\n")
                     print("Se ha enviado un flag de fuera de servicio.")
                     print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!\n")
                     error = 0 
+                    if photo is None:
+                        continue
+
+            last_photo = photo
+            jpg_path = photo[1]
+
+            # Se busca un frame casi identico ya contado, si la camara entrega
+            # siempre la misma imagen se envía el flag de fuera de servicio
+            clave, resultado = cache.lookup(jpg_path)
+            if not usar_cache:
+                resultado = None
+            if cache.frozen:
+                print(send_data(0, store, cliente_agregador, http, flag=1))
+
+                print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!\n")
+                print(f"Camara congelada, la misma imagen se repite {cache.repeticiones} veces.")
+                print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!\n")
+                continue
 
-            last_photo_path = jpg_path
+            # Las cajas solo se asocian en modo normal, en modo ROI las
+            # coordenadas de cada zona no son comparables
+            con_cajas = tracker is not None and modo == 'normal'
 
             # Correr el modelo
-            cantidad = Runner(jpg_path, modo, confidence, model)
+            if resultado is None:
+                entrada = jpg_path
+                if preprocessor is not None:
+                    # Se reutilizan las metricas que ya calculo el modulo de la camara
+                    frame, info = preprocessor.process(imread(jpg_path), cam_module.get_photo_metrics(jpg_path))
+                    if info['condiciones']:
+                        print(f"Preprocesamiento: {info['condiciones']} ({info['total_ms']:.1f} ms)")
+                    entrada = frame
+                if paralelo is not None:
+                    resultado = paralelo.run(entrada, modo, return_boxes=con_cajas)
+                else:
+                    resultado = Runner(entrada, modo, confidence, model, return_boxes=con_cajas,
+                                       save=guardar_predicciones, imgsz=tamano_entrada)
+                if usar_cache:
+                    cache.store(clave, resultado)
+            else:
+                print(f"Frame casi identico a uno ya analizado, se reutiliza el conteo ({cache.hits} aciertos)")
+
+            if con_cajas:
+                cantidad, cajas = resultado
+                cajas = cajas[0]
+            else:
+                cantidad, cajas = resultado, None
+
+            confianza = None
+            if tracker is not None:
+                estado = tracker.update(cantidad, cajas)
+                print(f"Conteo: {estado['cantidad_cruda']} -> {estado['cantidad']} (confianza {estado['confianza']})")
+                cantidad = estado['cantidad']
+                confianza = estado['confianza']
+
+            if load_times:
+                # Tiempos de importación de torch/ultralytics y carga del modelo, solo la primera vez
+                for step, seconds in load_times.items():
+                    print(f"{step}: {seconds:.3f} s")
+                load_times.clear()
 
             # Enviar los datos a la API
             print("------Datos enviados------")
-            print(send_data(cantidad))
+            print(send_data(cantidad, store, cliente_agregador, http, confianza=confianza))
             print("--------------------------\n")
 
             capturing = cam_module.get_capturing()
@@ -129,6 +298,30 @@ def main():
         print("Captura interrumpida.")
         cam_module.close_camera()
 
+    # Se espera que el thread de la cámara termine de cerrar y se escriben
+    # los frames que quedaron en el archivo
+    thread_cam.join()
+    cam_module.close()
+
+    if preprocessor is not None:
+        preprocessor.print_summary()
+
+    if paralelo is not None:
+        paralelo.close()
+
+    if tamano_entrada == 'auto':
+        from inference_sizing import sizer
+        for forma, geometria in sizer.summary().items():
+            print(f"Entrada {forma}: {geometria}")
+
+    if store is not None:
+        store.close()
+
+    if cliente_agregador is not None:
+        cliente_agregador.close()
+
+    http.close()
+
 if __name__ == "__main__":
     main()
     
\ No newline at end of file
@@ -0,0 +1,395 @@
+import os
+import json
+import time
+import glob
+import struct
+import threading
+from array import array
+from datetime import datetime
+
+
+class CountStore:
+    """
+    Almacén local de series de tiempo para los conteos (zona, tiempo, cantidad, flag).
+
+    Los registros se acumulan en columnas en memoria y se escriben en segmentos
+    binarios columnares de solo-agregado, cuyo nombre incluye el rango de
+    tiempo que cubren. Al agregar cada registro se actualizan de forma
+    incremental los rollups por minuto, hora y día, así las consultas de rango
+    y agregación se responden desde los rollups en milisegundos sin recorrer
+    los registros crudos. La retención de segmentos y rollups es acotada.
+
+    Cada registro se agrega además a un journal en disco hasta que su segmento
+    se escribe, y los rollups se guardan cada rollup_seconds. Si el proceso
+    muere (por ejemplo por falta de memoria), al reabrir el almacén se
+    recuperan del journal los registros pendientes y los rollups que no
+    alcanzaron a guardarse.
+
+    Los registros con flag (fuera de servicio) no entran en el promedio, el
+    mínimo ni el máximo, solo se cuentan en 'flags'.
+
+    Los buckets están alineados a la época (UTC). Un rango se cubre con los
+    buckets más grandes que quepan completos, por lo que un día en hora local
+    se resuelve con horas y minutos en los bordes.
+    """
+    MAGIC = b"AFL1"
+    RESOLUTIONS = {'minuto': 60, 'hora': 3600, 'dia': 86400}
+    COLUMNS = (('tiempo', 'q'), ('zona', 'i'), ('cantidad', 'i'), ('flag', 'b'))
+    JOURNAL_ROW = struct.Struct("<qiib")
+
+    def __init__(self, directory="Afluencia_Store", segment_size=4096,
+                 retention_days=None, rollup_seconds=60):
+        """
+        Args:
+            directory (str): Directorio de los segmentos y rollups
+            segment_size (int): Registros por segmento
+            retention_days (dict): Días que se guardan los registros crudos ('crudo')
+                y cada rollup ('minuto', 'hora', 'dia')
+            rollup_seconds (float): Segundos máximos entre guardados de los rollups
+        """
+        self.directory = directory
+        self.segment_size = segment_size
+        self.rollup_seconds = rollup_seconds
+        self.retention_days = {'crudo': 30, 'minuto': 7, 'hora': 180, 'dia': 3650}
+        self.retention_days.update(retention_days or {})
+        self.rollups_path = os.path.join(directory, "rollups.json")
+        self.journal_path = os.path.join(directory, "journal.bin")
+        self._lock = threading.Lock()
+        self._buffer = {name: array(code) for name, code in self.COLUMNS}
+        self._journal = None  # Archivo del journal abierto para agregar
+        self._journaled = 0  # Registros en el journal
+        self._last_save = time.monotonic()
+
+        # resolución -> {(zona, inicio del bucket): [n, suma, min, max, flags]},
+        # n, suma, min y max son solo de los registros sin flag
+        self.rollups = {name: {} for name in self.RESOLUTIONS}
+
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        self._replay_journal(self._load_rollups())
+
+    # write methods
+
+    @staticmethod
+    def _epoch(timestamp):
+        """Convierte un datetime o un número a segundos desde la época."""
+        if isinstance(timestamp, datetime):
+            return int(timestamp.timestamp())
+        return int(timestamp)
+
+    def append(self, zona, timestamp, cantidad, flag=0):
+        """
+        Agrega un registro y actualiza los rollups.
+
+        Args:
+            zona (int): Zona del conteo
+            timestamp (datetime or float): Momento del conteo
+            cantidad (int): Cantidad de personas
+            flag (int): Flag del registro (1 = fuera de servicio)
+        """
+        t = self._epoch(timestamp)
+        zona, cantidad, flag = int(zona), int(cantidad), int(flag)
+        with self._lock:
+            for name, value in zip(('tiempo', 'zona', 'cantidad', 'flag'), (t, zona, cantidad, flag)):
+                self._buffer[name].append(value)
+
+            if self._journal is None:
+                self._journal = open(self.journal_path, "ab")
+            self._journal.write(self.JOURNAL_ROW.pack(t, zona, cantidad, flag))
+            self._journal.flush()
+            self._journaled += 1
+
+            self._update_rollups(zona, t, cantidad, flag)
+
+            if len(self._buffer['tiempo']) >= self.segment_size:
+                self._flush()
+            elif time.monotonic() - self._last_save >= self.rollup_seconds:
+                self._save_rollups()
+
+    def _update_rollups(self, zona, t, cantidad, flag):
+        """Suma un registro a los rollups de cada resolución."""
+        for name, seconds in self.RESOLUTIONS.items():
+            key = (zona, t - t % seconds)
+            stats = self.rollups[name].get(key)
+            if stats is None:
+                stats = self.rollups[name][key] = [0, 0, None, None, 0]
+            if flag:
+                stats[4] += 1
+            else:
+                self._merge(stats, [1, cantidad, cantidad, cantidad, 0])
+
+    @staticmethod
+    def _merge(stats, other):
+        """Suma las estadísticas other a stats ([n, suma, min, max, flags])."""
+        stats[0] += other[0]
+        stats[1] += other[1]
+        if other[2] is not None:
+            stats[2] = other[2] if stats[2] is None else min(stats[2], other[2])
+            stats[3] = other[3] if stats[3] is None else max(stats[3], other[3])
+        stats[4] += other[4]
+
+    def flush(self):
+        """Escribe los registros pendientes a un segmento y guarda los rollups."""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        """Igual que flush, pero asumiendo que ya se tiene el lock."""
+        n = len(self._buffer['tiempo'])
+        if n:
+            times = self._buffer['tiempo']
+            path = os.path.join(self.directory, f"seg_{min(times)}_{max(times)}_{time.time_ns()}.bin")
+            with open(path, "wb") as f:
+                f.write(self.MAGIC + struct.pack("<I", n))
+                for name, _ in self.COLUMNS:
+                    f.write(self._buffer[name].tobytes())
+            self._buffer = {name: array(code) for name, code in self.COLUMNS}
+
+        self._apply_retention()
+        # Los rollups se guardan antes de vaciar el journal: si el proceso muere
+        # entremedio, al reabrir el journal se salta en los rollups (ya los
+        # incluyen) y sus registros se repiten en el próximo segmento
+        self._save_rollups()
+        if n:
+            self._truncate_journal()
+            # Se vuelve a guardar con el journal vacío, si no sus próximos
+            # registros se tomarían como ya incluidos
+            self._save_rollups()
+
+    def close(self):
+        """Guarda todo lo pendiente."""
+        self.flush()
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+    # persistence methods
+
+    def _save_rollups(self):
+        """Guarda los rollups en disco (archivo temporal y reemplazo)."""
+        data = {name: [[zona, start] + stats for (zona, start), stats in rollup.items()]
+                for name, rollup in self.rollups.items()}
+        data['journal'] = self._journaled  # Registros del journal ya incluidos en los rollups
+        tmp_path = self.rollups_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.rollups_path)
+        self._last_save = time.monotonic()
+
+    def _load_rollups(self):
+        """
+        Carga los rollups guardados, si existen.
+
+        Returns:
+            int: Registros del journal que ya estaban incluidos en los rollups
+        """
+        try:
+            with open(self.rollups_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        for name in self.RESOLUTIONS:
+            self.rollups[name] = {(row[0], row[1]): row[2:] for row in data.get(name, [])}
+        return data.get('journal', 0)
+
+    def _replay_journal(self, included):
+        """
+        Recupera los registros del journal que no alcanzaron a llegar a un segmento.
+
+        Args:
+            included (int): Registros del journal que ya están en los rollups cargados
+        """
+        try:
+            with open(self.journal_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return
+        size = self.JOURNAL_ROW.size
+        n = len(data) // size
+        for i in range(n):
+            t, zona, cantidad, flag = self.JOURNAL_ROW.unpack_from(data, i * size)
+            for name, value in zip(('tiempo', 'zona', 'cantidad', 'flag'), (t, zona, cantidad, flag)):
+                self._buffer[name].append(value)
+            if i >= included:
+                self._update_rollups(zona, t, cantidad, flag)
+        self._journaled = n
+
+        if len(data) != n * size:
+            # Se descarta un registro escrito a medias
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(n * size)
+        if n:
+            print(f"Se recuperaron {n} registros del journal de {self.directory}.")
+
+    def _truncate_journal(self):
+        """Vacía el journal."""
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        open(self.journal_path, "wb").close()
+        self._journaled = 0
+
+    def _segments(self):
+        """Retorna los segmentos como tuplas (primer tiempo, último tiempo, ruta)."""
+        segments = []
+        for path in glob.glob(os.path.join(self.directory, "seg_*.bin")):
+            first, last, _ = os.path.basename(path)[4:-4].split("_")
+            segments.append((int(first), int(last), path))
+        return sorted(segments)
+
+    def _apply_retention(self, now=None):
+        """Elimina los segmentos y buckets más antiguos que la retención."""
+        now = time.time() if now is None else now
+        limit = now - self.retention_days['crudo'] * 86400
+        for _, last, path in self._segments():
+            if last < limit:
+                os.remove(path)
+
+        for name in self.RESOLUTIONS:
+            limit = now - self.retention_days[name] * 86400
+            rollup = self.rollups[name]
+            for key in [key for key in rollup if key[1] < limit]:
+                del rollup[key]
+
+    # query methods
+
+    @staticmethod
+    def _read_segment(path):
+        """Lee un segmento y retorna sus columnas."""
+        with open(path, "rb") as f:
+            data = f.read()
+        if data[:4] != CountStore.MAGIC:
+            raise ValueError(f"Segmento invalido: {path}")
+        n = struct.unpack("<I", data[4:8])[0]
+        offset = 8
+        columns = {}
+        for name, code in CountStore.COLUMNS:
+            column = array(code)
+            size = n * column.itemsize
+            column.frombytes(data[offset:offset + size])
+            columns[name] = column
+            offset += size
+        return columns
+
+    def raw(self, zona, inicio, fin):
+        """
+        Retorna los registros crudos de una zona en un rango, recorriendo solo
+        los segmentos que se solapan con él.
+
+        Args:
+            zona (int): Zona a consultar
+            inicio (datetime or float): Inicio del rango (incluido)
+            fin (datetime or float): Fin del rango (excluido)
+
+        Returns:
+            list: Tuplas (tiempo, cantidad, flag) ordenadas por tiempo
+        """
+        a, b = self._epoch(inicio), self._epoch(fin)
+        with self._lock:
+            sources = [{name: column[:] for name, column in self._buffer.items()}]
+        for first, last, path in self._segments():
+            if last >= a and first < b:
+                sources.append(self._read_segment(path))
+
+        records = []
+        for columns in sources:
+            for t, z, cantidad, flag in zip(columns['tiempo'], columns['zona'], columns['cantidad'], columns['flag']):
+                if z == zona and a <= t < b:
+                    records.append((t, cantidad, flag))
+        return sorted(records)
+
+    def series(self, zona, inicio, fin, resolucion='hora'):
+        """
+        Retorna la serie agregada de una zona a una resolución.
+
+        Args:
+            zona (int): Zona a consultar
+            inicio (datetime or float): Inicio del rango (incluido)
+            fin (datetime or float): Fin del rango (excluido)
+            resolucion (str): 'minuto', 'hora' o 'dia'
+
+        Returns:
+            list: Tuplas (inicio del bucket, estadísticas) ordenadas por tiempo
+        """
+        a, b = self._epoch(inicio), self._epoch(fin)
+        with self._lock:
+            rollup = self.rollups[resolucion]
+            buckets = sorted((start, stats) for (z, start), stats in rollup.items() if z == zona and a <= start < b)
+        return [(start, self._stats(stats)) for start, stats in buckets]
+
+    def aggregate(self, zona, inicio, fin):
+        """
+        Agrega los conteos de una zona en un rango, cubriéndolo con los buckets
+        más grandes que quepan completos. La precisión del rango es de un minuto.
+
+        Args:
+            zona (int): Zona a consultar
+            inicio (datetime or float): Inicio del rango (incluido)
+            fin (datetime or float): Fin del rango (excluido)
+
+        Si los buckets de un borde del rango ya se borraron por la retención
+        (por ejemplo los minutos, después de 7 días), se usa el bucket más
+        grueso que los contiene y el resultado se marca como aproximado.
+
+        Returns:
+            dict: 'registros', 'promedio', 'minimo', 'maximo' y 'flags' del rango,
+                y 'aproximado' si el rango se extendió a buckets más grandes
+        """
+        a, b = self._epoch(inicio), self._epoch(fin)
+        a -= a % 60
+        b -= b % 60
+
+        names = ('minuto', 'hora', 'dia')
+        now = time.time()
+        total = [0, 0, None, None, 0]
+        aproximado = False
+        with self._lock:
+            t = a
+            while t < b:
+                for name in reversed(names):
+                    seconds = self.RESOLUTIONS[name]
+                    if t % seconds == 0 and t + seconds <= b:
+                        break
+                i = names.index(name)
+                while i < len(names) - 1 and t - t % seconds < now - self.retention_days[name] * 86400:
+                    i += 1
+                    name = names[i]
+                    seconds = self.RESOLUTIONS[name]
+                    aproximado = True
+                start = t - t % seconds
+                stats = self.rollups[name].get((zona, start))
+                if stats is not None:
+                    self._merge(total, stats)
+                t = start + seconds
+        result = self._stats(total)
+        result['aproximado'] = aproximado
+        return result
+
+    @staticmethod
+    def _stats(stats):
+        """Convierte [n, suma, min, max, flags] en un diccionario."""
+        n, suma, minimo, maximo, flags = stats
+        return {
+            'registros': n,
+            'promedio': suma / n if n else None,
+            'minimo': minimo,
+            'maximo': maximo,
+            'flags': flags
+        }
+
+
+if __name__ == "__main__":
+    # Consulta rápida: python count_store.py <directorio> <zona> "2026-10-19 10:00" "2026-10-19 11:00"
+    import sys
+
+    store = CountStore(sys.argv[1])
+    zona = int(sys.argv[2])
+    inicio = datetime.fromisoformat(sys.argv[3])
+    fin = datetime.fromisoformat(sys.argv[4])
+
+    start = time.perf_counter()
+    result = store.aggregate(zona, inicio, fin)
+    print(f"Zona {zona} entre {inicio} y {fin}: {result} ({(time.perf_counter() - start) * 1000:.2f} ms)")
+    for bucket, stats in store.series(zona, inicio, fin, 'hora'):
+        print(f"  {datetime.fromtimestamp(bucket)}: {stats}")
@@ -0,0 +1,170 @@
+import math
+import numpy as np
+
+
+class CountTracker:
+    """
+    Etapa temporal opcional que estabiliza la cantidad de personas entre
+    capturas consecutivas de una misma cámara.
+
+    Cada llamada a Runner es independiente, por lo que el conteo salta varias
+    personas entre fotos. Esta clase filtra la serie de conteos con un filtro
+    de Kalman escalar (o un EMA) y, si se le entregan las cajas detectadas,
+    asocia las detecciones entre frames por IoU. La medición que entra al
+    filtro es siempre el conteo del frame actual; los tracks perdidos solo
+    sirven para asociar y para estimar qué tan estables son las detecciones
+    (y con eso la confianza), así una multitud que camina no se cuenta dos
+    veces.
+
+    El IoU se calcula como una matriz de numpy, así la asociación escala a
+    escenas con cientos de cajas.
+    """
+    def __init__(self, modo="kalman", alpha=0.3, ruido_proceso=1.0, ruido_medicion=4.0,
+                 iou_umbral=0.3, max_perdidos=2):
+        """
+        Args:
+            modo (str): Filtro a usar sobre los conteos, 'kalman' o 'ema'
+            alpha (float): Peso de la medición nueva en el modo 'ema'
+            ruido_proceso (float): Varianza con que cambia la afluencia real
+                entre capturas (modo 'kalman')
+            ruido_medicion (float): Varianza del conteo entregado por el
+                modelo (modo 'kalman')
+            iou_umbral (float): IoU mínimo para asociar una caja a un track
+            max_perdidos (int): Frames que un track puede no ser visto antes
+                de descartarlo
+        """
+        if modo not in ("kalman", "ema"):
+            raise ValueError("Modo de suavizado invalido, debe ser 'kalman' o 'ema'.")
+
+        self.modo = modo
+        self.alpha = alpha
+        self.ruido_proceso = ruido_proceso
+        self.ruido_medicion = ruido_medicion
+        self.iou_umbral = iou_umbral
+        self.max_perdidos = max_perdidos
+        self.reset()
+
+    def reset(self):
+        """Reinicia el estado del filtro y de los tracks."""
+        self.estimado = None  # Conteo filtrado
+        self.varianza = None  # Varianza del estimado (o de las innovaciones en 'ema')
+        self.tracks = []  # Lista de [caja, perdidos]
+
+    # tracking methods
+
+    @staticmethod
+    def _iou_matriz(a, b):
+        """
+        Calcula el IoU entre todas las cajas de a y de b (formato xyxy).
+
+        Returns:
+            np.ndarray: Matriz (len(a), len(b)) de IoU
+        """
+        a = np.asarray(a, dtype=np.float32).reshape(-1, 4)
+        b = np.asarray(b, dtype=np.float32).reshape(-1, 4)
+        ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+        iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+        ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+        iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+        inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+        area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+        area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+        union = area_a[:, None] + area_b[None, :] - inter
+        return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+    def _asociar(self, cajas):
+        """
+        Asocia las cajas del frame actual con los tracks existentes de forma
+        golosa por IoU.
+
+        Args:
+            cajas (list): Cajas xyxy detectadas en el frame actual
+
+        Returns:
+            tuple: (cantidad de cajas del frame actual, fraccion de tracks
+                previos que fueron vistos de nuevo)
+        """
+        pares = []
+        if self.tracks and cajas:
+            iou = self._iou_matriz([caja for caja, _ in self.tracks], cajas)
+            # Solo los pares sobre el umbral, ordenados de mayor a menor IoU
+            ts, ds = np.nonzero(iou >= self.iou_umbral)
+            orden = np.argsort(-iou[ts, ds], kind="stable")
+            pares = [(int(ts[i]), int(ds[i])) for i in orden]
+
+        tracks_usados, cajas_usadas = set(), set()
+        for t, d in pares:
+            if t in tracks_usados or d in cajas_usadas:
+                continue
+            tracks_usados.add(t)
+            cajas_usadas.add(d)
+            self.tracks[t] = [cajas[d], 0]
+
+        # Los tracks no vistos se mantienen unos frames antes de descartarlos
+        tracks_previos = len(self.tracks)
+        for t in range(tracks_previos):
+            if t not in tracks_usados:
+                self.tracks[t][1] += 1
+        self.tracks = [track for track in self.tracks if track[1] <= self.max_perdidos]
+
+        # Las cajas sin track crean uno nuevo
+        for d, caja in enumerate(cajas):
+            if d not in cajas_usadas:
+                self.tracks.append([caja, 0])
+
+        estabilidad = len(tracks_usados) / tracks_previos if tracks_previos else 1.0
+        # Los tracks perdidos no se cuentan: la persona pudo haberse movido y
+        # tener ya una caja nueva en este frame
+        return len(cajas), estabilidad
+
+    # filter methods
+
+    def _filtrar(self, medicion):
+        """Aplica el filtro configurado a una medición de conteo."""
+        if self.estimado is None:
+            self.estimado = float(medicion)
+            self.varianza = self.ruido_medicion if self.modo == "kalman" else 0.0
+            return
+
+        if self.modo == "kalman":
+            # Prediccion (modelo de afluencia constante) y corrección
+            varianza_predicha = self.varianza + self.ruido_proceso
+            ganancia = varianza_predicha / (varianza_predicha + self.ruido_medicion)
+            self.estimado += ganancia * (medicion - self.estimado)
+            self.varianza = (1 - ganancia) * varianza_predicha
+        else:
+            innovacion = medicion - self.estimado
+            self.estimado += self.alpha * innovacion
+            self.varianza = (1 - self.alpha) * (self.varianza + self.alpha * innovacion ** 2)
+
+    def update(self, cantidad, cajas=None):
+        """
+        Incorpora el conteo de un nuevo frame y entrega el conteo estabilizado.
+
+        Args:
+            cantidad (int): Cantidad de personas entregada por el modelo
+            cajas (list): Cajas xyxy del frame (opcional), solo tiene sentido
+                en modo 'normal' donde todas comparten sistema de coordenadas
+
+        Returns:
+            dict: 'cantidad' estabilizada (int), 'estimado' (float),
+                'confianza' (0 a 1) y 'cantidad_cruda' entregada por el modelo
+        """
+        medicion = cantidad
+        estabilidad = 1.0
+        if cajas is not None:
+            medicion, estabilidad = self._asociar(cajas)
+
+        self._filtrar(medicion)
+
+        # La confianza baja cuando la incertidumbre es grande respecto al
+        # conteo o cuando los tracks no se mantienen entre frames
+        desviacion = math.sqrt(max(self.varianza, 0.0))
+        confianza = estabilidad / (1.0 + desviacion / max(self.estimado, 1.0))
+
+        return {
+            'cantidad': int(round(self.estimado)),
+            'estimado': self.estimado,
+            'confianza': round(confianza, 3),
+            'cantidad_cruda': cantidad
+        }
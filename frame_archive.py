@@ -0,0 +1,210 @@
+import os
+import json
+import glob
+import time
+import queue
+import threading
+import cv2
+
+
+class FrameArchive:
+    """
+    Archivo de frames en disco, acotado y comprimido, que se escribe en un
+    hilo de fondo.
+
+    CameraModule le entrega cada foto y sigue capturando: la codificación y
+    la escritura a disco ocurren fuera del hilo de captura. Los frames se
+    guardan (opcionalmente reducidos) con el encoder y la calidad
+    configurados, empaquetados en segmentos de solo-agregado con un índice
+    por segmento en vez de un archivo por frame. Cuando el archivo supera el
+    presupuesto de bytes se borran los segmentos más antiguos, así se pueden
+    guardar días de evidencia en vez de las últimas 100 fotos.
+    """
+    def __init__(self, directory="Frame_Archive", encoder=".jpg", quality=80, thumbnail_size=None,
+                 segment_bytes=64 * 1024 * 1024, budget_bytes=2 * 1024 * 1024 * 1024, queue_size=8):
+        """
+        Args:
+            directory (str): Directorio de los segmentos
+            encoder (str): Formato de los frames ('.jpg', '.webp' o '.png')
+            quality (int): Calidad JPEG/WebP (0-100) o nivel de compresión PNG (0-9)
+            thumbnail_size (int): Si se indica, lado mayor en pixeles de los frames guardados
+            segment_bytes (int): Tamaño a partir del cual se abre un segmento nuevo
+            budget_bytes (int): Bytes máximos del archivo completo
+            queue_size (int): Frames que pueden esperar a ser escritos
+        """
+        params = {
+            ".jpg": [cv2.IMWRITE_JPEG_QUALITY, quality],
+            ".webp": [cv2.IMWRITE_WEBP_QUALITY, quality],
+            ".png": [cv2.IMWRITE_PNG_COMPRESSION, quality]
+        }
+        if encoder not in params:
+            raise ValueError(f"Encoder invalido: {encoder}. Usa '.jpg', '.webp' o '.png'.")
+
+        self.directory = directory
+        self.encoder = encoder
+        self.encode_params = params[encoder]
+        self.thumbnail_size = thumbnail_size
+        self.segment_bytes = segment_bytes
+        self.budget_bytes = budget_bytes
+
+        self.stats = {"guardados": 0, "descartados": 0, "bytes": 0, "segmentos_borrados": 0}
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._closed = threading.Event()
+        self._segment = None  # (número, archivo de datos, archivo de índice)
+
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+        self._thread = threading.Thread(target=self._run, name="FrameArchive", daemon=True)
+        self._thread.start()
+
+    def submit(self, frame, photo_number, working_path=None, on_saved=None):
+        """
+        Encola un frame para archivarlo, sin bloquear al hilo de captura.
+
+        Args:
+            frame (np.ndarray): Frame BGR
+            photo_number (int): Número de la foto en CameraModule
+            working_path (str): Si se indica, el frame completo también se escribe
+                en esta ruta (la foto de trabajo que lee Runner)
+            on_saved (callable): Se llama en el hilo de escritura cuando la foto de
+                trabajo ya está en disco
+
+        Returns:
+            bool: False si la cola estaba llena y el frame se descartó
+        """
+        if self._closed.is_set():
+            return False
+        try:
+            self._queue.put_nowait((frame, photo_number, working_path, on_saved, time.time()))
+        except queue.Full:
+            self.stats["descartados"] += 1
+            return False
+        return True
+
+    def _run(self):
+        """Loop del hilo de escritura."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            try:
+                self._write(*item)
+            except (OSError, cv2.error) as error:
+                print(f"Error archivando el frame {item[1]}: {error}")
+            finally:
+                self._queue.task_done()
+        self._close_segment()
+
+    def _write(self, frame, photo_number, working_path, on_saved, timestamp):
+        """Escribe la foto de trabajo y agrega el frame al segmento actual."""
+        if working_path is not None:
+            # Se escribe a un temporal y se reemplaza, así nadie lee una foto a medias
+            root, ext = os.path.splitext(working_path)
+            tmp_path = f"{root}.tmp{ext}"
+            cv2.imwrite(tmp_path, frame)
+            os.replace(tmp_path, working_path)
+            if on_saved is not None:
+                on_saved()
+
+        image = frame
+        if self.thumbnail_size:
+            h, w = frame.shape[:2]
+            scale = self.thumbnail_size / max(h, w)
+            if scale < 1:
+                image = cv2.resize(frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+
+        ok, encoded = cv2.imencode(self.encoder, image, self.encode_params)
+        if not ok:
+            raise OSError("No se pudo codificar el frame.")
+        data = encoded.tobytes()
+
+        number, data_file, index_file = self._current_segment()
+        offset = data_file.tell()
+        data_file.write(data)
+        index_file.write(json.dumps({"foto": photo_number, "tiempo": timestamp, "offset": offset,
+                                     "bytes": len(data), "forma": list(image.shape)}) + "\n")
+        data_file.flush()
+        index_file.flush()
+
+        self.stats["guardados"] += 1
+        self.stats["bytes"] += len(data)
+        if data_file.tell() >= self.segment_bytes:
+            self._close_segment()
+        self._enforce_budget()
+
+    # segment methods
+
+    def _segment_paths(self, number):
+        """Retorna las rutas de datos e índice de un segmento."""
+        base = os.path.join(self.directory, f"seg_{number:06d}")
+        return base + ".dat", base + ".idx"
+
+    def segments(self):
+        """Retorna los números de los segmentos existentes, del más antiguo al más nuevo."""
+        return sorted(int(os.path.basename(path)[4:10]) for path in glob.glob(os.path.join(self.directory, "seg_*.dat")))
+
+    def _current_segment(self):
+        """Retorna el segmento abierto, creando uno nuevo si hace falta."""
+        if self._segment is None:
+            existing = self.segments()
+            number = existing[-1] + 1 if existing else 1
+            data_path, index_path = self._segment_paths(number)
+            self._segment = (number, open(data_path, "ab"), open(index_path, "a"))
+        return self._segment
+
+    def _close_segment(self):
+        """Cierra el segmento abierto."""
+        if self._segment is not None:
+            _, data_file, index_file = self._segment
+            data_file.close()
+            index_file.close()
+            self._segment = None
+
+    def _enforce_budget(self):
+        """Borra los segmentos más antiguos mientras el archivo supere el presupuesto."""
+        segments = self.segments()
+        sizes = {n: os.path.getsize(self._segment_paths(n)[0]) for n in segments}
+        total = sum(sizes.values())
+        current = self._segment[0] if self._segment is not None else None
+        for number in segments:
+            if total <= self.budget_bytes or number == current:
+                break
+            for path in self._segment_paths(number):
+                os.remove(path)
+            total -= sizes[number]
+            self.stats["segmentos_borrados"] += 1
+
+    # read methods
+
+    def iter_frames(self, start=None, end=None):
+        """
+        Recorre los frames archivados en un rango de tiempo.
+
+        Args:
+            start (float): Tiempo (época) desde el que se leen frames
+            end (float): Tiempo (época) hasta el que se leen frames
+
+        Yields:
+            tuple: (entrada del índice, frame decodificado)
+        """
+        import numpy as np
+
+        for number in self.segments():
+            data_path, index_path = self._segment_paths(number)
+            with open(index_path) as index_file, open(data_path, "rb") as data_file:
+                for line in index_file:
+                    entry = json.loads(line)
+                    if (start is not None and entry["tiempo"] < start) or (end is not None and entry["tiempo"] > end):
+                        continue
+                    data_file.seek(entry["offset"])
+                    buffer = np.frombuffer(data_file.read(entry["bytes"]), dtype=np.uint8)
+                    yield entry, cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+    def close(self):
+        """Escribe los frames pendientes y detiene el hilo. Se puede llamar más de una vez."""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._queue.put(None)
+        self._thread.join(timeout=30)
@@ -0,0 +1,145 @@
+import time
+import hashlib
+from collections import OrderedDict
+import cv2
+
+
+class FrameCache:
+    """
+    Cache LRU que se pone delante de Runner y reutiliza el conteo de frames
+    casi idénticos.
+
+    La clave de cada frame es un hash perceptual (dHash) de una versión
+    reducida en escala de grises, por lo que dos capturas de una escena que
+    no cambió caen en la misma entrada aunque tengan ruido del sensor.
+    Además se guarda un digest exacto del frame reducido: cuando ese digest
+    se repite en muchas capturas seguidas la cámara está congelada (entrega
+    siempre la misma imagen), cosa que la comparación de rutas no detecta.
+
+    En una cámara fija el fondo domina la imagen reducida, así que frames con
+    distinta ocupación pueden tener hashes muy parecidos. Por eso por defecto
+    el hash es de 256 bits y solo se aceptan coincidencias exactas, y cada
+    entrada vence después de max_edad segundos o max_usos reutilizaciones.
+    """
+    def __init__(self, capacidad=32, umbral_hamming=0, repeticiones_congelada=12, tamano_hash=16,
+                 max_edad=60.0, max_usos=5):
+        """
+        Args:
+            capacidad (int): Cantidad máxima de frames guardados
+            umbral_hamming (int): Distancia de Hamming máxima entre dos dHash
+                para considerar los frames casi idénticos
+            repeticiones_congelada (int): Capturas seguidas con el mismo frame
+                exacto para avisar que la cámara está congelada
+            tamano_hash (int): Lado del dHash, el hash tiene tamano_hash**2 bits
+            max_edad (float): Segundos que una entrada se puede reutilizar, None sin límite
+            max_usos (int): Veces que una entrada se puede reutilizar, None sin límite
+        """
+        self.capacidad = capacidad
+        self.umbral_hamming = umbral_hamming
+        self.repeticiones_congelada = repeticiones_congelada
+        self.tamano_hash = tamano_hash
+        self.max_edad = max_edad
+        self.max_usos = max_usos
+
+        self.entries = OrderedDict()  # dHash -> [valor cacheado, tiempo de guardado, usos]
+        self.hits = 0
+        self.misses = 0
+        self._ultimo_digest = None
+        self.repeticiones = 0  # Veces seguidas que se repite el mismo frame exacto
+
+    @property
+    def frozen(self):
+        """Retorna True si el mismo frame se ha repetido demasiadas veces seguidas."""
+        return self.repeticiones >= self.repeticiones_congelada
+
+    def _load_gray(self, frame):
+        """Carga el frame en escala de grises, decodificando a 1/8 si es una ruta."""
+        if isinstance(frame, str):
+            # Para el hash no hace falta decodificar la imagen completa
+            return cv2.imread(frame, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+        if frame.ndim == 3:
+            return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return frame
+
+    def key(self, frame):
+        """
+        Calcula la clave de un frame.
+
+        Args:
+            frame (str or np.ndarray): Ruta de la imagen o imagen BGR
+
+        Returns:
+            tuple: (dHash como int, digest exacto del frame reducido)
+        """
+        gray = self._load_gray(frame)
+        n = self.tamano_hash
+        small = cv2.resize(gray, (n + 1, n), interpolation=cv2.INTER_AREA)
+
+        # dHash: cada bit indica si un pixel es mas brillante que su vecino derecho
+        bits = (small[:, 1:] > small[:, :-1]).flatten()
+        dhash = 0
+        for bit in bits:
+            dhash = (dhash << 1) | int(bit)
+
+        thumb = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA)
+        digest = hashlib.blake2b(thumb.tobytes(), digest_size=16).digest()
+        return dhash, digest
+
+    def lookup(self, frame):
+        """
+        Busca un frame casi idéntico en el cache y actualiza la detección de
+        cámara congelada.
+
+        Args:
+            frame (str or np.ndarray): Ruta de la imagen o imagen BGR
+
+        Returns:
+            tuple: (clave del frame, valor cacheado o None si no hay)
+        """
+        clave = self.key(frame)
+        dhash, digest = clave
+
+        if digest == self._ultimo_digest:
+            self.repeticiones += 1
+        else:
+            self._ultimo_digest = digest
+            self.repeticiones = 1
+
+        mejor, mejor_distancia = None, self.umbral_hamming + 1
+        for cached_hash in self.entries:
+            distancia = bin(cached_hash ^ dhash).count("1")
+            if distancia < mejor_distancia:
+                mejor, mejor_distancia = cached_hash, distancia
+                if distancia == 0:
+                    break
+
+        if mejor is not None:
+            valor, guardado, usos = self.entries[mejor]
+            if ((self.max_edad is not None and time.monotonic() - guardado > self.max_edad)
+                    or (self.max_usos is not None and usos >= self.max_usos)):
+                # Entrada vencida, se vuelve a correr el modelo y se reemplaza
+                del self.entries[mejor]
+                mejor = None
+
+        if mejor is None:
+            self.misses += 1
+            return clave, None
+
+        self.hits += 1
+        self.entries[mejor][2] += 1
+        self.entries.move_to_end(mejor)
+        return clave, valor
+
+    def store(self, clave, valor):
+        """Guarda el valor de un frame, descartando el menos usado si el cache está lleno."""
+        dhash = clave[0]
+        self.entries[dhash] = [valor, time.monotonic(), 0]
+        self.entries.move_to_end(dhash)
+        while len(self.entries) > self.capacidad:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        """Vacía el cache y reinicia la detección de cámara congelada."""
+        self.entries.clear()
+        self._ultimo_digest = None
+        self.repeticiones = 0
@@ -0,0 +1,130 @@
+import time
+from image_enhancer import ImageEnhancer
+from image_metrics import ImageMetrics
+
+
+class FramePreprocessor:
+    """
+    Etapa de preprocesamiento condicional entre CameraModule y Runner.
+
+    En vez de aplicar todos los filtros de ImageEnhancer a cada frame (lo que
+    suma decenas de milisegundos), se miran las métricas de ImageMetrics que
+    ya se calcularon para el frame y solo se aplica la cadena de filtros
+    asociada a la condición detectada. Los frames buenos pasan sin tocarse.
+    Se registra el tiempo de cada filtro para saber cuánto del presupuesto de
+    latencia se lleva el mejoramiento.
+    """
+
+    # Cada regla es: (métrica, umbral, cadena de filtros). La regla se activa
+    # cuando la métrica del frame queda bajo el umbral.
+    DEFAULT_RULES = {
+        'oscura': ('brightness', 60, [('adjust_gamma', {'gamma': 1.8}), ('apply_clahe', {})]),
+        'bajo_contraste': ('image_contrast', 30, [('apply_clahe', {})]),
+        'borrosa': ('variance_of_laplacian', 50, [('apply_unsharp_mask', {})]),
+    }
+
+    def __init__(self, rules=None):
+        """
+        Args:
+            rules (dict): Reglas condicion -> (métrica, umbral, cadena). Si no
+                se entregan se usan DEFAULT_RULES
+        """
+        self.rules = rules if rules is not None else self.DEFAULT_RULES
+        self.frames = 0  # Frames procesados
+        self.frames_mejorados = 0  # Frames a los que se les aplicó algún filtro
+        self.tiempos = {}  # filtro -> (veces aplicado, tiempo total en ms)
+        self.pipelines = {}  # cadena -> EnhancerPipeline compilado
+
+    def conditions(self, metrics):
+        """
+        Retorna las condiciones que cumple un frame según sus métricas.
+
+        Args:
+            metrics (dict): Métricas del frame entregadas por ImageMetrics.get_metrics
+
+        Returns:
+            list: Nombres de las reglas activadas
+        """
+        return [name for name, (metric, threshold, _) in self.rules.items()
+                if metrics[metric] < threshold]
+
+    def chain(self, conditions):
+        """Arma la cadena de filtros de las condiciones, sin repetir filtros."""
+        steps = []
+        for name in conditions:
+            for step in self.rules[name][2]:
+                if step[0] not in [s[0] for s in steps]:
+                    steps.append(step)
+        return steps
+
+    def _pipeline(self, steps):
+        """Retorna el pipeline compilado de una cadena, creandolo la primera vez."""
+        key = tuple((name, tuple(sorted(kwargs.items()))) for name, kwargs in steps)
+        pipeline = self.pipelines.get(key)
+        if pipeline is None:
+            pipeline = ImageEnhancer.pipeline(steps, color="BGR")
+            self.pipelines[key] = pipeline
+        return pipeline
+
+    def process(self, frame, metrics=None):
+        """
+        Aplica al frame solo los filtros que necesita.
+
+        Args:
+            frame (np.ndarray): Imagen BGR capturada por la cámara
+            metrics (dict): Métricas ya calculadas del frame. Si es None se
+                calculan aquí
+
+        Returns:
+            tuple: (frame resultante, dict con las condiciones detectadas, el
+                tiempo de cada filtro en ms y el tiempo total en ms). El frame
+                resultante vive en un buffer que se reutiliza en la siguiente
+                llamada con la misma cadena
+        """
+        start = time.perf_counter()
+        if metrics is None:
+            metrics = ImageMetrics.get_metrics(frame, file_path=False)
+            self._registrar('metricas', (time.perf_counter() - start) * 1000)
+
+        self.frames += 1
+        conditions = self.conditions(metrics)
+        steps = self.chain(conditions)
+        info = {'condiciones': conditions, 'tiempos': {}, 'total_ms': 0.0}
+        if not steps:
+            info['total_ms'] = (time.perf_counter() - start) * 1000
+            return frame, info
+
+        self.frames_mejorados += 1
+
+        # La cadena compilada se reutiliza (LUTs, CLAHE y buffers) y trabaja
+        # directo en BGR, sin conversiones de color
+        result = self._pipeline(steps).apply(frame, info['tiempos'])
+        for name, elapsed_ms in info['tiempos'].items():
+            self._registrar(name, elapsed_ms)
+
+        info['total_ms'] = (time.perf_counter() - start) * 1000
+        return result, info
+
+    def _registrar(self, name, elapsed_ms):
+        """Acumula el tiempo de un filtro y lo retorna."""
+        count, total = self.tiempos.get(name, (0, 0.0))
+        self.tiempos[name] = (count + 1, total + elapsed_ms)
+        return elapsed_ms
+
+    def summary(self):
+        """
+        Resume los tiempos acumulados de cada filtro.
+
+        Returns:
+            dict: filtro -> {'veces', 'total_ms', 'promedio_ms'}
+        """
+        return {name: {'veces': count, 'total_ms': total, 'promedio_ms': total / count}
+                for name, (count, total) in self.tiempos.items()}
+
+    def print_summary(self):
+        """Imprime el resumen de tiempos del preprocesamiento."""
+        print(f" ------------------------- Tiempos de preprocesamiento -------------------------")
+        print(f"  Frames mejorados: {self.frames_mejorados} de {self.frames}")
+        for name, stats in self.summary().items():
+            print(f"  {name}: {stats['promedio_ms']:.2f} ms promedio ({stats['veces']} veces)")
+        print(f"--------------------------------------------------------------------------------\n")
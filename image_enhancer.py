@@ -1,7 +1,5 @@
 import cv2
 import numpy as np
-from skimage.feature import hog
-from skimage import exposure
 
 class ImageEnhancer:
     """
@@ -16,7 +14,14 @@ class ImageEnhancer:
     - split_image(image_input)
     - apply_bilateral_filter(image_input, d=15, sigma_color=75, sigma_space=75)
     - apply_unsharp_mask(image_input, ksize=(5, 5), alpha=1.5, beta=-0.5)
+    - pipeline(steps, color="RGB")
+
+    Gamma LUTs and CLAHE objects are cached per parameter set and shared by
+    the static methods and the pipelines.
     """  
+    _lut_cache = {}
+    _clahe_cache = {}
+
     @staticmethod
     def enhance_edges_with_hog(image_input):
         """
@@ -28,6 +33,9 @@ class ImageEnhancer:
         Returns:
             numpy.ndarray: The enhanced image with edges highlighted.
         """
+        from skimage.feature import hog
+        from skimage import exposure
+
         img_gray = cv2.cvtColor(ImageEnhancer._load_image(image_input), cv2.COLOR_RGB2GRAY)
         
         hog_image = hog(img_gray, orientations=8, pixels_per_cell=(16, 16), cells_per_block=(1, 1), visualize=True, multichannel=False)[1]
@@ -79,26 +87,28 @@ class ImageEnhancer:
         upper_black = np.array([40, 40, 40], dtype=np.uint8)
         mask_black = cv2.inRange(img_rgb, lower_black, upper_black)
 
-        alpha = alpha
         img_enhanced = img_rgb.copy()
-        img_enhanced[mask_black == 255] = np.clip(alpha * img_enhanced[mask_black == 255], 0, 255)
+        black = np.nonzero(mask_black)
+        img_enhanced[black] = ImageEnhancer._boost_lut(alpha)[img_enhanced[black]]
 
         return img_enhanced
 
     @staticmethod
-    def apply_clahe(image_input):
+    def apply_clahe(image_input, clip_limit=2.0, tile_grid_size=(8, 8)):
         """
         Applies Contrast Limited Adaptive Histogram Equalization (CLAHE) to the input image.
 
         Args:
             image_input (str): The path to the input image.
+            clip_limit (float): Threshold for contrast limiting. Defaults to 2.0.
+            tile_grid_size (tuple): Size of the grid of tiles. Defaults to (8, 8).
 
         Returns:
             numpy.ndarray: The enhanced image.
         """
         img_rgb = ImageEnhancer._load_image(image_input)
             
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        clahe = ImageEnhancer._get_clahe(clip_limit, tile_grid_size)
         img_lab = cv2.cvtColor(img_rgb, cv2.COLOR_RGB2LAB)
         l_channel, a_channel, b_channel = cv2.split(img_lab)
         cl = clahe.apply(l_channel)
@@ -120,12 +130,85 @@ class ImageEnhancer:
             numpy.ndarray: The adjusted image.
         """
         img_rgb = ImageEnhancer._load_image(image_input)
-        inv_gamma = 1.0 / gamma
-        table = np.array([(i / 255.0) ** inv_gamma * 255 for i in np.arange(0, 256)]).astype("uint8")
-        result = cv2.LUT(img_rgb, table)
+        result = cv2.LUT(img_rgb, ImageEnhancer._gamma_lut(gamma))
 
         return result
 
+    @staticmethod
+    def _gamma_lut(gamma):
+        """
+        Returns the cached 256-entry lookup table for a gamma value.
+
+        Args:
+            gamma (float): The gamma value.
+
+        Returns:
+            numpy.ndarray: The uint8 lookup table.
+        """
+        key = ('gamma', gamma)
+        table = ImageEnhancer._lut_cache.get(key)
+        if table is None:
+            inv_gamma = 1.0 / gamma
+            table = ((np.arange(0, 256) / 255.0) ** inv_gamma * 255).astype("uint8")
+            ImageEnhancer._lut_cache[key] = table
+        return table
+
+    @staticmethod
+    def _boost_lut(alpha):
+        """
+        Returns the cached lookup table that multiplies values by alpha, used for black regions.
+
+        Args:
+            alpha (float): The enhancement factor.
+
+        Returns:
+            numpy.ndarray: The uint8 lookup table.
+        """
+        key = ('boost', alpha)
+        table = ImageEnhancer._lut_cache.get(key)
+        if table is None:
+            table = np.clip(alpha * np.arange(0, 256), 0, 255).astype("uint8")
+            ImageEnhancer._lut_cache[key] = table
+        return table
+
+    @staticmethod
+    def _get_clahe(clip_limit=2.0, tile_grid_size=(8, 8)):
+        """
+        Returns the cached CLAHE object for a parameter set.
+
+        Args:
+            clip_limit (float): Threshold for contrast limiting.
+            tile_grid_size (tuple): Size of the grid of tiles.
+
+        Returns:
+            cv2.CLAHE: The CLAHE object.
+        """
+        key = (clip_limit, tuple(tile_grid_size))
+        clahe = ImageEnhancer._clahe_cache.get(key)
+        if clahe is None:
+            clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tuple(tile_grid_size))
+            ImageEnhancer._clahe_cache[key] = clahe
+        return clahe
+
+    @staticmethod
+    def pipeline(steps, color="RGB"):
+        """
+        Builds a reusable filter chain.
+
+        Consecutive pointwise steps (adjust_gamma, apply_better_black_regions) are
+        fused into a single lookup table pass, and every step writes into
+        preallocated buffers that are reused across calls.
+
+        Args:
+            steps (list): Method names or (method name, kwargs) tuples, e.g.
+                [("adjust_gamma", {"gamma": 1.8}), "apply_clahe"].
+            color (str): Channel order of the images, "RGB" or "BGR". Defaults to "RGB".
+
+        Returns:
+            EnhancerPipeline: The compiled chain.
+        """
+        return EnhancerPipeline(steps, color)
+
     @staticmethod
     def apply_gaussian_blur(image_input, ksize=(5, 5)):
         """
@@ -254,6 +337,9 @@ class ImageEnhancer:
         Returns:
             numpy.ndarray: The visualization of HOG descriptor.
         """
+        from skimage.feature import hog
+        from skimage import exposure
+
         img_gray = cv2.cvtColor(ImageEnhancer._load_image(image_input), cv2.COLOR_RGB2GRAY)
         
         hog_image = hog(img_gray, orientations=8, pixels_per_cell=(16, 16), cells_per_block=(1, 1), visualize=True)[1]
@@ -262,3 +348,192 @@ class ImageEnhancer:
 
         return hog_image_rescaled
 
+
+class EnhancerPipeline:
+    """
+    A compiled chain of ImageEnhancer filters. Use ImageEnhancer.pipeline to build one.
+
+    Consecutive pointwise steps are collapsed into one stage made of two lookup
+    tables (one for the pixels outside the black regions and one for the pixels
+    inside them), so gamma followed by a black region boost costs a single LUT
+    pass. Every stage writes into buffers preallocated per image shape, so the
+    array returned by apply is owned by the pipeline and is overwritten by the
+    next call. A pipeline is not meant to be shared between threads.
+    """
+    POINTWISE = ("adjust_gamma", "apply_better_black_regions")
+    FILTERS = ("apply_clahe", "apply_gaussian_blur", "apply_sharpening", "apply_bilateral_filter", "apply_unsharp_mask")
+    BLACK_LIMIT = 40  # Upper bound used by apply_better_black_regions
+    SHARPEN_KERNEL = np.array([
+        [ 0, -0.25,  0],
+        [-0.25,  2, -0.25],
+        [ 0, -0.25,  0]
+    ])
+
+    def __init__(self, steps, color="RGB"):
+        """
+        Args:
+            steps (list): Method names or (method name, kwargs) tuples.
+            color (str): Channel order of the images, "RGB" or "BGR".
+
+        Raises:
+            ValueError: If a step or the color order is not supported.
+        """
+        if color not in ("RGB", "BGR"):
+            raise ValueError("Invalid color order. Use 'RGB' or 'BGR'.")
+        self.color = color
+        self.to_lab = cv2.COLOR_RGB2LAB if color == "RGB" else cv2.COLOR_BGR2LAB
+        self.from_lab = cv2.COLOR_LAB2RGB if color == "RGB" else cv2.COLOR_LAB2BGR
+        self.stages = self._compile([step if isinstance(step, tuple) else (step, {}) for step in steps])
+        self._buffers = {}
+        self._batch = None
+
+    @property
+    def names(self):
+        """Returns the name of every stage, fused stages are joined with '+'."""
+        return [stage[0] for stage in self.stages]
+
+    def _compile(self, steps):
+        """
+        Groups the steps into stages, fusing consecutive pointwise steps.
+
+        Args:
+            steps (list): (method name, kwargs) tuples.
+
+        Returns:
+            list: (name, kind, params) tuples.
+        """
+        stages = []
+        run = []
+        for name, kwargs in steps:
+            if name in self.POINTWISE:
+                # A run holds at most one black region step, the mask of a second
+                # one would depend on the output of the first.
+                if name == "apply_better_black_regions" and any(n == name for n, _ in run):
+                    stages.append(self._fuse(run))
+                    run = []
+                run.append((name, kwargs))
+                continue
+            if run:
+                stages.append(self._fuse(run))
+                run = []
+            if name not in self.FILTERS:
+                raise ValueError(f"Unsupported pipeline step: {name}")
+            if name == "apply_clahe":
+                kwargs = dict(kwargs)
+                kwargs["clahe"] = ImageEnhancer._get_clahe(kwargs.pop("clip_limit", 2.0), kwargs.pop("tile_grid_size", (8, 8)))
+            stages.append((name, name, kwargs))
+        if run:
+            stages.append(self._fuse(run))
+        return stages
+
+    def _fuse(self, run):
+        """
+        Collapses a run of pointwise steps into a single lookup stage.
+
+        Args:
+            run (list): (method name, kwargs) tuples with at most one black region step.
+
+        Returns:
+            tuple: (name, "lut", (lut outside the mask, lut inside the mask, mask threshold))
+        """
+        identity = np.arange(0, 256, dtype=np.uint8)
+        pre, post, boost = identity, identity, None
+        for name, kwargs in run:
+            if name == "adjust_gamma":
+                table = ImageEnhancer._gamma_lut(kwargs.get("gamma", 1.0))
+                if boost is None:
+                    pre = table[pre]
+                else:
+                    post = table[post]
+            else:
+                boost = ImageEnhancer._boost_lut(kwargs.get("alpha", 2.0))
+
+        name = "+".join(n for n, _ in run)
+        if boost is None:
+            return (name, "lut", (pre, None, -1))
+
+        # The black mask is computed on the output of 'pre'. Gamma tables are
+        # monotonic, so it is the same as thresholding the input at the largest
+        # value that 'pre' maps inside the black range.
+        inside = np.nonzero(pre <= self.BLACK_LIMIT)[0]
+        threshold = int(inside[-1]) if len(inside) else -1
+        return (name, "lut", (post[pre], post[boost[pre]], threshold))
+
+    def _buffer(self, index, shape, dtype=np.uint8, slot=0):
+        """Returns the preallocated buffer of a stage for an image shape."""
+        key = (index, slot, shape, dtype)
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            buffer = np.empty(shape, dtype=dtype)
+            self._buffers[key] = buffer
+        return buffer
+
+    def apply(self, image_input, timings=None):
+        """
+        Runs the chain over one image.
+
+        Args:
+            image_input (str or np.ndarray): The input image.
+            timings (dict): If given, the time in ms of every stage is added to it.
+
+        Returns:
+            numpy.ndarray: The result, stored in a buffer owned by the pipeline.
+        """
+        src = ImageEnhancer._load_image(image_input)
+        if self.color == "BGR" and isinstance(image_input, str):
+            src = cv2.cvtColor(src, cv2.COLOR_RGB2BGR)
+
+        for index, (name, kind, params) in enumerate(self.stages):
+            start = cv2.getTickCount()
+            out = self._buffer(index, src.shape)
+            if kind == "lut":
+                lut_out, lut_in, threshold = params
+                cv2.LUT(src, lut_out, dst=out)
+                if threshold >= 0:
+                    mask = cv2.inRange(src, (0, 0, 0), (threshold, threshold, threshold),
+                                       dst=self._buffer(index, src.shape[:2], slot=1))
+                    black = np.nonzero(mask)
+                    out[black] = lut_in[src[black]]
+            elif kind == "apply_clahe":
+                lab = cv2.cvtColor(src, self.to_lab, dst=self._buffer(index, src.shape, slot=1))
+                l_channel = cv2.extractChannel(lab, 0, dst=self._buffer(index, src.shape[:2], slot=2))
+                cl = params["clahe"].apply(l_channel, dst=self._buffer(index, src.shape[:2], slot=3))
+                cv2.insertChannel(cl, lab, 0)
+                cv2.cvtColor(lab, self.from_lab, dst=out)
+            elif kind == "apply_gaussian_blur":
+                cv2.GaussianBlur(src, tuple(params.get("ksize", (5, 5))), 0, dst=out)
+            elif kind == "apply_sharpening":
+                cv2.filter2D(src, -1, self.SHARPEN_KERNEL, dst=out)
+            elif kind == "apply_bilateral_filter":
+                cv2.bilateralFilter(src, params.get("d", 15), params.get("sigma_color", 75),
+                                    params.get("sigma_space", 75), dst=out)
+            elif kind == "apply_unsharp_mask":
+                blurred = cv2.GaussianBlur(src, tuple(params.get("ksize", (5, 5))), 0,
+                                           dst=self._buffer(index, src.shape, slot=1))
+                cv2.addWeighted(src, params.get("alpha", 1.5), blurred, params.get("beta", -0.5), 0, dst=out)
+            if timings is not None:
+                elapsed = (cv2.getTickCount() - start) * 1000 / cv2.getTickFrequency()
+                timings[name] = timings.get(name, 0.0) + elapsed
+            src = out
+
+        return src
+
+    def apply_batch(self, images, timings=None):
+        """
+        Runs the chain over a batch of images of the same shape.
+
+        Args:
+            images (list): Input images.
+            timings (dict): If given, the time in ms of every stage is accumulated in it.
+
+        Returns:
+            numpy.ndarray: Array of shape (n, h, w, c) with the results, reused across calls.
+        """
+        first = self.apply(images[0], timings)
+        shape = (len(images),) + first.shape
+        if self._batch is None or self._batch.shape != shape:
+            self._batch = np.empty(shape, dtype=first.dtype)
+        self._batch[0] = first
+        for i in range(1, len(images)):
+            self._batch[i] = self.apply(images[i], timings)
+        return self._batch
@@ -0,0 +1,145 @@
+import numpy as np
+import cv2
+
+
+class InferenceSizer:
+    """
+    Elige el tamaño de entrada del modelo según la forma de cada imagen.
+
+    En vez de llevar todo al imgsz por defecto de ultralytics (que rellena
+    de más las franjas de la cruz y achica tanto los frames completos que las
+    personas pequeñas desaparecen), cada forma de entrada recibe su propia
+    geometría de letterbox: se escala el lado mayor a lo sumo hasta max_side
+    sin agrandar la imagen más de max_scale, y el resultado se rellena hasta
+    múltiplos del stride del modelo. La geometría y los buffers rellenos se
+    guardan por forma y se reutilizan entre frames, y las imagenes de la
+    misma forma se agrupan en un solo lote.
+    """
+    def __init__(self, max_side=1280, max_scale=1.0, stride=32, pad_value=114):
+        """
+        Args:
+            max_side (int): Lado mayor máximo de la entrada del modelo
+            max_scale (float): Escala máxima, 1.0 nunca agranda las imagenes
+            stride (int): Stride máximo del modelo, las entradas son múltiplos de él
+            pad_value (int): Valor del relleno (el gris de ultralytics)
+        """
+        self.max_side = max_side
+        self.max_scale = max_scale
+        self.stride = stride
+        self.pad_value = pad_value
+        self._geometry = dict()  # (alto, ancho) -> (escala, alto y ancho escalados, alto y ancho rellenos)
+        self._buffers = dict()   # (alto, ancho) -> array (n, alto relleno, ancho relleno, 3)
+
+    def geometry(self, shape):
+        """
+        Calcula (o recupera) la geometría de letterbox de una forma.
+
+        Args:
+            shape (tuple): Forma de la imagen (alto, ancho[, canales])
+
+        Returns:
+            tuple: (escala, (alto, ancho) escalados, (alto, ancho) rellenos)
+        """
+        key = tuple(shape[:2])
+        if key not in self._geometry:
+            h, w = key
+            scale = min(self.max_scale, self.max_side / max(h, w))
+            new_h, new_w = max(1, round(h * scale)), max(1, round(w * scale))
+            pad_h = -(-new_h // self.stride) * self.stride
+            pad_w = -(-new_w // self.stride) * self.stride
+            self._geometry[key] = (scale, (new_h, new_w), (pad_h, pad_w))
+        return self._geometry[key]
+
+    def _buffer(self, shape, n):
+        """Retorna un buffer relleno para n imagenes de la forma dada, reutilizando el anterior."""
+        key = tuple(shape[:2])
+        _, _, (pad_h, pad_w) = self.geometry(key)
+        buffer = self._buffers.get(key)
+        if buffer is None or len(buffer) < n:
+            # El relleno se escribe una sola vez, cada frame solo pisa su región escalada
+            buffer = np.full((n, pad_h, pad_w, 3), self.pad_value, dtype=np.uint8)
+            self._buffers[key] = buffer
+        return buffer
+
+    def letterbox(self, images):
+        """
+        Escala y rellena un grupo de imagenes de la misma forma en su buffer.
+
+        La imagen queda en la esquina superior izquierda, así las cajas se
+        llevan de vuelta a la imagen original dividiendo solo por la escala.
+
+        Args:
+            images (list): Imagenes BGR de la misma forma
+
+        Returns:
+            list: Vistas del buffer con cada imagen rellena. Se sobreescriben en
+                la siguiente llamada con la misma forma
+        """
+        shape = images[0].shape
+        _, (new_h, new_w), _ = self.geometry(shape)
+        buffer = self._buffer(shape, len(images))
+        for i, image in enumerate(images):
+            if image.shape[:2] != (new_h, new_w):
+                image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_AREA)
+            buffer[i, :new_h, :new_w] = image
+        return [buffer[i] for i in range(len(images))]
+
+    def group(self, images):
+        """
+        Agrupa los índices de las imagenes por forma, en orden de aparición.
+
+        Args:
+            images (list): Imagenes BGR
+
+        Returns:
+            dict: (alto, ancho) -> lista de índices
+        """
+        groups = dict()
+        for i, image in enumerate(images):
+            groups.setdefault(tuple(image.shape[:2]), []).append(i)
+        return groups
+
+    def to_original(self, boxes_xyxyn, shape):
+        """
+        Lleva cajas xyxy normalizadas a la entrada rellena de vuelta a la imagen original.
+
+        Args:
+            boxes_xyxyn (list): Cajas [x1, y1, x2, y2] normalizadas a la entrada rellena
+            shape (tuple): Forma de la imagen original
+
+        Returns:
+            list: Cajas [x1, y1, x2, y2] normalizadas a la imagen original
+        """
+        h, w = shape[:2]
+        scale, _, (pad_h, pad_w) = self.geometry(shape)
+        fx, fy = pad_w / scale / w, pad_h / scale / h
+        return [[min(1.0, x1 * fx), min(1.0, y1 * fy), min(1.0, x2 * fx), min(1.0, y2 * fy)]
+                for x1, y1, x2, y2 in boxes_xyxyn]
+
+    def predict(self, model, images, **kwargs):
+        """
+        Corre el modelo con un lote por forma y la geometría de cada una.
+
+        Args:
+            model (YOLO): Modelo cargado
+            images (list): Imagenes BGR
+            **kwargs: Argumentos de model.predict (conf, classes, save, ...)
+
+        Returns:
+            list: Resultados de ultralytics en el mismo orden que images
+        """
+        results = [None] * len(images)
+        for shape, indices in self.group(images).items():
+            _, _, padded = self.geometry(shape)
+            batch = self.letterbox([images[i] for i in indices])
+            for i, result in zip(indices, model.predict(batch, imgsz=list(padded), **kwargs)):
+                results[i] = result
+        return results
+
+    def summary(self):
+        """Retorna la geometría elegida para cada forma vista."""
+        return {f"{h}x{w}": f"escala {scale:.2f} -> {pad_h}x{pad_w}"
+                for (h, w), (scale, _, (pad_h, pad_w)) in self._geometry.items()}
+
+
+sizer = InferenceSizer() # Compartido por Counter cuando imgsz es 'auto'
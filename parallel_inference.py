@@ -0,0 +1,272 @@
+"""
+Inferencia en CPU repartida en varias réplicas del modelo.
+
+En máquinas con varios núcleos y sin GPU, una sola llamada a predict con los
+hilos por defecto de PyTorch aprovecha mal los núcleos: los 8 recortes del
+modo ROI suelen salir antes repartidos entre varias réplicas, cada una con
+pocos hilos. ParallelCounter levanta K procesos, cada uno con su modelo ya
+cargado, torch.set_num_threads(T) y opcionalmente fijado a sus propios
+núcleos, y reparte entre ellos los recortes (o los frames) de cada llamada.
+
+autotune prueba combinaciones de K y T con una imagen del sitio, además del
+modelo en el mismo proceso, y guarda la mejor en inferencia_paralela.json por
+(modelo, modo, imgsz). central_afluencia la usa con inferencia_paralela =
+'auto' solo si hay una entrada para su misma combinación.
+
+Uso:
+    python parallel_inference.py test.jpg --modelo yolov8x.pt --modo ROI --imgsz auto
+"""
+import os
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from Counter import Counter, image_reader, load_model
+
+CONFIG_PATH = "inferencia_paralela.json"
+
+
+def config_key(weight: str, modo: str, imgsz):
+    """Clave de la configuración guardada: la mejor combinación depende del modelo, el modo y el tamaño."""
+    return f"{weight}|{modo}|{imgsz}"
+
+
+def available_cores():
+    """Retorna los núcleos que puede usar este proceso."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _init_replica(weight: str, threads: int, pin: bool, cores: list, next_replica):
+    """Inicializa una réplica: hilos de torch, núcleos propios y modelo ya cargado."""
+    # Antes de importar torch, para que OpenMP tampoco abra más hilos
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    with next_replica.get_lock():
+        replica = next_replica.value
+        next_replica.value += 1
+
+    if pin and hasattr(os, "sched_setaffinity"):
+        own = cores[replica * threads:(replica + 1) * threads]
+        if own:
+            os.sched_setaffinity(0, own)
+
+    import torch
+    torch.set_num_threads(threads)
+    load_model(weight)
+
+
+def _predict_boxes(images: list, conf: float, weight: str, imgsz):
+    """Corre el modelo de la réplica y retorna las cajas de cada imagen."""
+    _, boxes = Counter(images, conf, weight, return_boxes=True, save=False, imgsz=imgsz)
+    return boxes
+
+
+class ParallelCounter:
+    """Reparte la inferencia entre K réplicas del modelo en procesos separados."""
+    def __init__(self, weight: str, replicas: int = 2, threads: int = None, pin: bool = False,
+                 conf: float = 0.2, imgsz=None):
+        """
+        Args:
+            weight (str): Peso del modelo YOLO
+            replicas (int): Procesos, cada uno con su modelo
+            threads (int): Hilos de torch por réplica, None reparte los núcleos disponibles
+            pin (bool): Fijar cada réplica a sus propios núcleos (solo Linux)
+            conf (float): Confianza del modelo
+            imgsz (int or str): Tamaño de entrada, igual que en Counter
+        """
+        cores = available_cores()
+        self.weight = weight
+        self.replicas = replicas
+        self.threads = threads or max(1, len(cores) // replicas)
+        self.pin = pin
+        self.conf = conf
+        self.imgsz = imgsz
+
+        # spawn para no heredar el estado de torch si este proceso ya lo cargó
+        context = multiprocessing.get_context("spawn")
+        self._pool = ProcessPoolExecutor(max_workers=replicas, mp_context=context, initializer=_init_replica,
+                                         initargs=(weight, self.threads, pin, cores, context.Value("i", 0)))
+
+    def warmup(self, images: list):
+        """Carga el modelo en todas las réplicas corriendo una imagen en cada una."""
+        futures = [self._pool.submit(_predict_boxes, images[:1], self.conf, self.weight, self.imgsz)
+                   for _ in range(self.replicas)]
+        for future in futures:
+            future.result()
+
+    def predict_boxes(self, images: list):
+        """
+        Reparte las imagenes en trozos contiguos, uno por réplica.
+
+        Args:
+            images (list): Imagenes BGR (recortes de un frame o varios frames)
+
+        Returns:
+            list: Cajas xyxy normalizadas de cada imagen, en el mismo orden
+        """
+        n = min(self.replicas, len(images))
+        if n == 0:
+            return []
+        size, extra = divmod(len(images), n)
+        futures, start = [], 0
+        for i in range(n):
+            end = start + size + (1 if i < extra else 0)
+            futures.append(self._pool.submit(_predict_boxes, images[start:end], self.conf, self.weight, self.imgsz))
+            start = end
+
+        boxes = []
+        for future in futures:
+            boxes.extend(future.result())
+        return boxes
+
+    def run(self, dir, modo: str, return_boxes: bool = False):
+        """
+        Igual que Counter.Runner, pero con la inferencia repartida entre las réplicas.
+
+        Args:
+            dir (str or np.array): Ruta de la imagen o imagen ya cargada
+            modo (str): 'normal' o 'ROI'
+            return_boxes (bool): Si es True tambien se entregan las cajas por imagen
+
+        Returns:
+            int: Cantidad de personas detectadas
+            (int, list): Si return_boxes es True, la cantidad y las cajas por imagen
+        """
+        boxes = self.predict_boxes(image_reader(dir, modo))
+        total = sum(len(b) for b in boxes)
+        print(f"Total: {total} Personas (Model: {self.weight}, {self.replicas}x{self.threads} hilos)")
+        if return_boxes:
+            return total, boxes
+        return total
+
+    def close(self):
+        """Termina las réplicas."""
+        self._pool.shutdown()
+
+    @classmethod
+    def from_config(cls, weight: str, config, conf: float = 0.2, imgsz=None, modo: str = "normal"):
+        """
+        Crea el contador desde una configuración.
+
+        Args:
+            weight (str): Peso del modelo YOLO
+            config (str or dict): 'auto' para leer CONFIG_PATH, o un diccionario con
+                'replicas', 'hilos' y 'fijar_nucleos'
+            conf (float): Confianza del modelo
+            imgsz (int or str): Tamaño de entrada, igual que en Counter
+            modo (str): 'normal' o 'ROI', la configuración guardada depende de él
+
+        Returns:
+            ParallelCounter: Contador, o None si se debe usar el modelo en este
+                proceso (config 'auto' sin una entrada para este modelo, modo e
+                imgsz, o una entrada que eligió el modelo en este proceso)
+        """
+        if config == "auto":
+            key = config_key(weight, modo, imgsz)
+            try:
+                with open(CONFIG_PATH) as f:
+                    config = json.load(f).get(key)
+            except (OSError, ValueError):
+                config = None
+            if config is None:
+                print(f"No hay configuración en {CONFIG_PATH} para {key}, se usa un solo modelo. "
+                      f"Corre parallel_inference.py con el mismo modelo, modo e imgsz.")
+                return None
+        if config["replicas"] < 1:
+            return None
+        return cls(weight, config["replicas"], config.get("hilos"), config.get("fijar_nucleos", False), conf, imgsz)
+
+
+def autotune(weight: str, images: list, pin: bool = True, repeats: int = 3, conf: float = 0.2,
+             imgsz=None, save: bool = True, modo: str = "ROI"):
+    """
+    Mide combinaciones de réplicas e hilos y elige la de menor latencia.
+
+    Cada combinación reparte todos los núcleos disponibles (K réplicas de T
+    hilos con K * T igual a los núcleos), más una réplica con la mitad de
+    los núcleos. También se mide el modelo en este proceso (0 réplicas), que
+    suele ganar cuando cada llamada tiene una sola imagen. La carga de los
+    modelos no entra en la medición.
+
+    Args:
+        weight (str): Peso del modelo YOLO
+        images (list): Imagenes de una llamada típica, las de image_reader con el modo dado
+        pin (bool): Fijar cada réplica a sus núcleos
+        repeats (int): Llamadas medidas por combinación
+        conf (float): Confianza del modelo
+        imgsz (int or str): Tamaño de entrada, igual que en Counter
+        save (bool): Guardar la mejor combinación en CONFIG_PATH
+        modo (str): Modo con que se leyeron las imagenes, parte de la clave guardada
+
+    Returns:
+        dict: Mejor combinación ('replicas', 'hilos', 'fijar_nucleos', 'latencia_ms'),
+            con 'replicas' 0 si gana el modelo en este proceso
+    """
+    cores = len(available_cores())
+    candidates = [(k, cores // k) for k in (1, 2, 3, 4, 6, 8) if k <= min(cores, len(images))]
+    candidates.append((1, max(1, cores // 2)))
+
+    # Referencia: el modelo en este proceso con los hilos por defecto de torch
+    load_model(weight)
+    _predict_boxes(images, conf, weight, imgsz)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        _predict_boxes(images, conf, weight, imgsz)
+    latency = (time.perf_counter() - start) / repeats * 1000
+    print(f"En este proceso: {latency:.0f} ms por llamada ({len(images) / latency * 1000:.1f} img/s)")
+    results = [{"replicas": 0, "hilos": None, "fijar_nucleos": False, "latencia_ms": latency}]
+
+    for replicas, threads in sorted(set(candidates)):
+        counter = ParallelCounter(weight, replicas, threads, pin, conf, imgsz)
+        try:
+            counter.warmup(images)
+            start = time.perf_counter()
+            for _ in range(repeats):
+                counter.predict_boxes(images)
+            latency = (time.perf_counter() - start) / repeats * 1000
+        finally:
+            counter.close()
+        print(f"{replicas} réplicas x {threads} hilos: {latency:.0f} ms por llamada "
+              f"({len(images) / latency * 1000:.1f} img/s)")
+        results.append({"replicas": replicas, "hilos": threads, "fijar_nucleos": pin, "latencia_ms": latency})
+
+    best = min(results, key=lambda row: row["latencia_ms"])
+    if save:
+        try:
+            with open(CONFIG_PATH) as f:
+                configs = json.load(f)
+        except (OSError, ValueError):
+            configs = {}
+        configs[config_key(weight, modo, imgsz)] = best
+        with open(CONFIG_PATH, "w") as f:
+            json.dump(configs, f, indent=2)
+        print(f"Configuración guardada en {CONFIG_PATH}")
+    return best
+
+
+def main():
+    """Punto de entrada de la línea de comandos."""
+    parser = argparse.ArgumentParser(description="Elige réplicas e hilos de inferencia con un benchmark corto.")
+    parser.add_argument("imagen", help="Imagen representativa del sitio")
+    parser.add_argument("--modelo", default="yolov8x.pt")
+    parser.add_argument("--modo", default="ROI", choices=["normal", "ROI"])
+    parser.add_argument("--conf", type=float, default=0.2)
+    parser.add_argument("--imgsz", type=lambda v: v if v == "auto" else int(v), default=None,
+                        help="Tamaño de entrada, igual que tamano_entrada en central_afluencia ('auto' o entero)")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--sin-fijar", action="store_true", help="No fijar las réplicas a sus núcleos")
+    args = parser.parse_args()
+
+    best = autotune(args.modelo, image_reader(args.imagen, args.modo), not args.sin_fijar, args.repeticiones, args.conf,
+                    args.imgsz, modo=args.modo)
+    if best["replicas"] == 0:
+        print(f"Mejor: el modelo en este proceso ({best['latencia_ms']:.0f} ms)")
+    else:
+        print(f"Mejor: {best['replicas']} réplicas x {best['hilos']} hilos ({best['latencia_ms']:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
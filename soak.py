@@ -0,0 +1,390 @@
+"""
+Prueba de resistencia (soak) del loop completo de central_afluencia.
+
+Corre central_afluencia.main durante horas con una fuente repetida (video o
+carpeta de capturas en loop) o sintética, a un ritmo acelerado y contra una
+API local de prueba. Cada cierto intervalo muestrea el RSS, los mayores
+asignadores de tracemalloc, los descriptores de archivo abiertos y la
+cantidad de hilos. Al terminar ajusta una recta a cada serie (descartando el
+calentamiento) y falla con código 1 si alguna pendiente supera su límite, así
+sirve de control de regresión para fugas.
+
+Con --estres se prueba en cambio la concurrencia de CameraModule: el hilo de
+captura produce fotos sin pausa mientras varios consumidores leen la última
+foto publicada, y al final varios hilos cierran la cámara a la vez.
+
+Uso:
+    python soak.py --horas 4 --fuente synthetic --modelo yolov8n.pt
+    python soak.py --horas 1 --fuente Capturas/ --max-rss-mb-h 5 --salida soak.csv
+    python soak.py --estres 60 --consumidores 8
+"""
+import os
+import sys
+import csv
+import time
+import argparse
+import threading
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _ApiStub(BaseHTTPRequestHandler):
+    """API local que acepta todo, en reemplazo de la API real."""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def open_fds():
+    """Cantidad de descriptores de archivo abiertos por el proceso."""
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        import psutil
+        process = psutil.Process()
+        return process.num_fds() if hasattr(process, "num_fds") else process.num_handles()
+
+
+def rss_bytes():
+    """RSS actual del proceso en bytes."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def slope_per_hour(times, values):
+    """Pendiente por hora de una recta ajustada por mínimos cuadrados."""
+    n = len(times)
+    if n < 2:
+        return 0.0
+    mean_t, mean_v = sum(times) / n, sum(values) / n
+    var_t = sum((t - mean_t) ** 2 for t in times)
+    if var_t == 0:
+        return 0.0
+    return sum((t - mean_t) * (v - mean_v) for t, v in zip(times, values)) / var_t * 3600
+
+
+class SoakMonitor:
+    """Muestrea el proceso en un hilo y calcula las pendientes de crecimiento."""
+    def __init__(self, interval=60.0, top=5):
+        """
+        Args:
+            interval (float): Segundos entre muestras
+            top (int): Asignadores de tracemalloc que se reportan en cada muestra
+        """
+        self.interval = interval
+        self.top = top
+        self.samples = []  # dicts con tiempo, rss_mb, tracemalloc_mb, fds e hilos
+        self._start = None
+        self._baseline = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="SoakMonitor", daemon=True)
+
+    def sample(self):
+        """Toma una muestra e imprime los asignadores que más crecieron."""
+        snapshot = tracemalloc.take_snapshot()
+        traced, _ = tracemalloc.get_traced_memory()
+        record = {
+            "tiempo": time.monotonic() - self._start,
+            "rss_mb": rss_bytes() / 1024 ** 2,
+            "tracemalloc_mb": traced / 1024 ** 2,
+            "fds": open_fds(),
+            "hilos": threading.active_count()
+        }
+        self.samples.append(record)
+
+        print(f"[soak] t={record['tiempo'] / 60:.1f} min rss={record['rss_mb']:.1f} MB "
+              f"py={record['tracemalloc_mb']:.1f} MB fds={record['fds']} hilos={record['hilos']}", file=sys.stderr)
+        if self._baseline is None:
+            self._baseline = snapshot
+        else:
+            for stat in snapshot.compare_to(self._baseline, "lineno")[:self.top]:
+                print(f"[soak]   {stat}", file=sys.stderr)
+        return record
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        tracemalloc.start(10)
+        self._start = time.monotonic()
+        self.sample()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+        tracemalloc.stop()
+
+    def slopes(self, warmup=0.1):
+        """
+        Pendientes por hora de cada serie, sin el calentamiento.
+
+        Args:
+            warmup (float): Fracción inicial de las muestras que se descarta
+
+        Returns:
+            dict: serie -> pendiente por hora
+        """
+        samples = self.samples[int(len(self.samples) * warmup):]
+        times = [s["tiempo"] for s in samples]
+        return {key: slope_per_hour(times, [s[key] for s in samples])
+                for key in ("rss_mb", "tracemalloc_mb", "fds", "hilos")}
+
+
+def _cheap_runner(dir, modo, conf, weight, return_boxes=False, save=True, imgsz=None):
+    """Reemplazo de Runner sin modelo: cuenta los pixeles claros, para aislar fugas fuera de la inferencia."""
+    import cv2
+    image = cv2.imread(dir) if isinstance(dir, str) else dir
+    cantidad = int((image > 200).mean() * 100)
+    return (cantidad, [[]]) if return_boxes else cantidad
+
+
+def _prepare_work_dir(work_dir):
+    """Entra al directorio de trabajo y crea la imagen de referencia si falta."""
+    os.makedirs(work_dir, exist_ok=True)
+    os.chdir(work_dir)
+
+    import cv2
+    import numpy as np
+    if not os.path.exists("test.jpg"):
+        # Referencia oscura y plana: cualquier frame con contenido la supera
+        cv2.imwrite("test.jpg", np.zeros((64, 64, 3), dtype=np.uint8))
+
+
+def run_stress(seconds, consumers=4, closers=4, work_dir="Soak", min_rate=5.0):
+    """
+    Prueba de estrés de la concurrencia de CameraModule.
+
+    Args:
+        seconds (float): Duración de la producción de fotos
+        consumers (int): Hilos que leen la última foto publicada sin pausa
+        closers (int): Hilos que cierran la cámara al mismo tiempo al final
+        work_dir (str): Directorio de trabajo
+        min_rate (float): Fotos por segundo que debe publicar el productor como mínimo
+
+    Returns:
+        bool: True si no hubo errores y productor y consumidores realmente corrieron
+    """
+    _prepare_work_dir(work_dir)
+    import cv2
+    from camera_module import CameraModule
+
+    cam_module = CameraModule(max_photos=10, capture_period=0, num_images_to_analyze=3, source="synthetic")
+    if cam_module.initialize(numero_fotos_inicial=3, initial_photo_period=0):
+        print("No se pudo inicializar la cámara sintética.")
+        return False
+
+    errors = []
+    reads = [0] * consumers
+    done = threading.Event()
+
+    # Se cuentan las fotos publicadas por el productor, sin las de la inicialización
+    published = [0]
+    publish = cam_module._publish
+
+    def counting_publish(photo_number, photo_path):
+        publish(photo_number, photo_path)
+        published[0] += 1
+    cam_module._publish = counting_publish
+
+    def produce():
+        try:
+            cam_module.capture(retry_delay=0.01, attemp_interval=0.01)
+        except Exception as error:
+            errors.append(f"captura: {error!r}")
+
+    def consume(n):
+        last = None
+        try:
+            while not done.is_set():
+                photo = cam_module.latest_photo()
+                if photo is None or photo == last:
+                    time.sleep(0.0005)
+                    continue
+                if last is not None and photo[2] < last[2]:
+                    errors.append(f"consumidor {n}: foto {photo[0]} anterior a la ya leída {last[0]}")
+                if cv2.imread(photo[1]) is None:
+                    errors.append(f"consumidor {n}: foto {photo[1]} ilegible")
+                last = photo
+                reads[n] += 1
+        except Exception as error:
+            errors.append(f"consumidor {n}: {error!r}")
+
+    cam_module.capturing = True
+    producer = threading.Thread(target=produce, name="productor")
+    readers = [threading.Thread(target=consume, args=(n,), name=f"consumidor{n}") for n in range(consumers)]
+    producer.start()
+    for reader in readers:
+        reader.start()
+    time.sleep(seconds)
+
+    # Varios cierres simultáneos: solo uno debe liberar la cámara y el hilo de
+    # captura debe salir de su espera de inmediato
+    start = time.perf_counter()
+    threads = [threading.Thread(target=cam_module.close_camera) for _ in range(closers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    producer.join(timeout=5)
+    stop_seconds = time.perf_counter() - start
+    if producer.is_alive():
+        errors.append("el hilo de captura no se detuvo")
+    cam_module.close_camera()
+    done.set()
+    for reader in readers:
+        reader.join()
+
+    # Sin fotos nuevas los consumidores solo releen la última foto inicial y la
+    # prueba no ejercita nada. Cada consumidor debe ver al menos la mitad de
+    # las fotos, el productor no publica más rápido de lo que ellos leen
+    if published[0] < min_rate * seconds:
+        errors.append(f"el productor publicó {published[0]} fotos, se esperaban al menos {min_rate * seconds:.0f}")
+    for n, count in enumerate(reads):
+        if count < published[0] / 2:
+            errors.append(f"consumidor {n}: vio {count} fotos distintas de {published[0]} publicadas")
+
+    print(" ------------------------- Resultado estrés -------------------------")
+    print(f"  Última foto: {cam_module.latest_photo()}")
+    print(f"  Fotos publicadas: {published[0]} ({published[0] / seconds:.1f} por segundo)")
+    print(f"  Fotos distintas vistas por consumidor: {reads}")
+    print(f"  Tiempo de detención: {stop_seconds * 1000:.1f} ms")
+    for error in errors[:20]:
+        print(f"  ERROR {error}")
+    print(f"--------------------------------------------------------------------")
+    return not errors
+
+
+def run_soak(hours, source, model, interval, period, limits, output=None, work_dir="Soak", use_model=True):
+    """
+    Corre el loop completo y evalúa las pendientes.
+
+    Args:
+        hours (float): Duración de la prueba
+        source (str): Fuente de frames ('synthetic', video, carpeta o glob de imagenes)
+        model (str): Peso del modelo YOLO
+        interval (float): Segundos entre muestras
+        period (float): Segundos entre capturas (acelerado respecto a producción)
+        limits (dict): Pendiente máxima por hora de cada serie
+        output (str): CSV donde guardar las muestras
+        work_dir (str): Directorio de trabajo (fotos, almacen y archivo de la prueba)
+        use_model (bool): Si es False se reemplaza Runner por un conteo barato
+
+    Returns:
+        bool: True si se publicaron capturas nuevas y ninguna pendiente supera su límite
+    """
+    source = source if "://" in source or source.startswith("synthetic") else os.path.abspath(source)
+    output = os.path.abspath(output) if output else None
+    _prepare_work_dir(work_dir)
+
+    api = ThreadingHTTPServer(("127.0.0.1", 0), _ApiStub)
+    threading.Thread(target=api.serve_forever, daemon=True).start()
+
+    # Las rutas relativas de central_afluencia (fotos, almacen, archivo) quedan
+    # dentro del directorio de trabajo
+    import central_afluencia
+    central_afluencia.api_url = f"http://127.0.0.1:{api.server_address[1]}/"
+    central_afluencia.model = model
+    central_afluencia.periodo_captura = period
+    central_afluencia.margen_loop = period / 2
+    central_afluencia.inicio_rapido = False
+    central_afluencia.numero_fotos_inicial = 3
+    if not use_model:
+        central_afluencia.Runner = _cheap_runner
+
+    # El módulo se arma como en producción (archivo de frames y grab continuo
+    # según la configuración de central_afluencia), solo cambia la fuente.
+    # El grab continuo corre con cámaras, streams y la fuente sintética
+    central_afluencia.fuente = source
+    central_afluencia.opciones_fuente = dict(central_afluencia.opciones_fuente)
+    if not source.startswith("synthetic") and "://" not in source:
+        central_afluencia.opciones_fuente["loop"] = True
+    cam_module = central_afluencia.build_camera_module()
+    print(f"Fuente: {cam_module.source!r}, grab continuo: {central_afluencia.ultimo_frame}, "
+          f"archivo de frames: {cam_module.archive is not None}")
+
+    monitor = SoakMonitor(interval=interval)
+    monitor.start()
+    runner = threading.Thread(target=central_afluencia.main, args=(cam_module,), name="central", daemon=True)
+    runner.start()
+
+    # Fotos distintas publicadas después de la inicialización, si no avanzan
+    # el loop solo repite la última foto inicial y la prueba no mide nada
+    init_photo, new_photos = None, set()
+    deadline = time.monotonic() + hours * 3600
+    while runner.is_alive() and time.monotonic() < deadline:
+        time.sleep(1)
+        photo = cam_module.latest_photo()
+        if init_photo is None and cam_module.capturing:
+            init_photo = photo
+        elif init_photo is not None and photo != init_photo:
+            new_photos.add(photo)
+    cam_module.stop()
+    runner.join(timeout=60)
+    monitor.stop()
+    api.shutdown()
+
+    if output:
+        with open(output, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(monitor.samples[0].keys()))
+            writer.writeheader()
+            writer.writerows(monitor.samples)
+
+    passed = bool(new_photos)
+    print(" ------------------------- Resultado soak -------------------------")
+    print(f"  Capturas nuevas después de la inicialización: {len(new_photos)}{'' if new_photos else '  FALLA'}")
+    for key, slope in monitor.slopes().items():
+        limit = limits.get(key)
+        failed = limit is not None and slope > limit
+        passed &= not failed
+        print(f"  {key}: {slope:+.3f} por hora (límite {limit}){'  FALLA' if failed else ''}")
+    print(f"------------------------------------------------------------------")
+    return passed
+
+
+def main():
+    """Punto de entrada de la línea de comandos."""
+    parser = argparse.ArgumentParser(description="Prueba de resistencia del loop de conteo.")
+    parser.add_argument("--horas", type=float, default=1.0)
+    parser.add_argument("--fuente", default="synthetic", help="'synthetic', video, carpeta o glob de imagenes")
+    parser.add_argument("--modelo", default="yolov8n.pt")
+    parser.add_argument("--intervalo", type=float, default=60.0, help="Segundos entre muestras")
+    parser.add_argument("--periodo", type=float, default=0.5, help="Segundos entre capturas")
+    parser.add_argument("--max-rss-mb-h", type=float, default=10.0)
+    parser.add_argument("--max-python-mb-h", type=float, default=5.0)
+    parser.add_argument("--max-fds-h", type=float, default=1.0)
+    parser.add_argument("--max-hilos-h", type=float, default=0.5)
+    parser.add_argument("--salida", default=None, help="CSV con las muestras")
+    parser.add_argument("--dir-trabajo", default="Soak")
+    parser.add_argument("--sin-modelo", action="store_true", help="Reemplaza el modelo por un conteo barato")
+    parser.add_argument("--estres", type=float, default=None, metavar="SEGUNDOS",
+                        help="Prueba de estrés de la concurrencia de CameraModule en vez del soak")
+    parser.add_argument("--consumidores", type=int, default=4)
+    args = parser.parse_args()
+
+    if args.estres is not None:
+        sys.exit(0 if run_stress(args.estres, args.consumidores, work_dir=args.dir_trabajo) else 1)
+
+    limits = {"rss_mb": args.max_rss_mb_h, "tracemalloc_mb": args.max_python_mb_h,
+              "fds": args.max_fds_h, "hilos": args.max_hilos_h}
+    passed = run_soak(args.horas, args.fuente, args.modelo, args.intervalo, args.periodo, limits,
+                      args.salida, args.dir_trabajo, not args.sin_modelo)
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Barrido de precisión contra latencia sobre modelos, modos, confianzas y
+tamaños de entrada.
+
+Usa el split anotado de un yaml de dataset (por ejemplo jhu_crowdV3.yaml, con
+etiquetas YOLO en labels/ paralelo a images/) o una carpeta local con las
+imagenes y su .txt de etiquetas al lado (o un conteos.csv con ruta,cantidad).
+Cada configuración pasa por Runner y se registra el MAE/MSE del conteo, la
+latencia p50/p95 y el pico de memoria. Cada configuración corre en un
+proceso nuevo, así el pico de memoria no incluye los modelos de las
+configuraciones anteriores (load_model los deja cargados). Al final se imprime la frontera de
+Pareto (MAE contra latencia p50) y, si se da un objetivo de MAE, la
+configuración más barata que lo cumple.
+
+Uso:
+    python sweep.py jhu_crowdV3.yaml --split val --limite 200 \\
+        --modelos yolov8n.pt yolov8s.pt yolov8x.pt --modos normal ROI \\
+        --conf 0.1 0.2 0.3 --imgsz 640 960 --objetivo-mae 3 --salida barrido.csv
+"""
+import os
+import csv
+import glob
+import time
+import argparse
+import threading
+import multiprocessing
+from itertools import product
+from concurrent.futures import ProcessPoolExecutor
+
+from Counter import Runner
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def _count_labels(label_path):
+    """Cuenta las personas de un archivo de etiquetas YOLO (una caja por línea)."""
+    if not os.path.exists(label_path):
+        return 0
+    with open(label_path) as f:
+        return sum(1 for line in f if line.strip())
+
+
+def load_dataset(spec: str, split: str = "val", limit: int = None):
+    """
+    Carga las imagenes anotadas y su conteo real.
+
+    Args:
+        spec (str): Yaml de dataset estilo ultralytics o carpeta local
+        split (str): Split del yaml a usar ('train', 'val' o 'test')
+        limit (int): Máximo de imagenes
+
+    Returns:
+        list: Tuplas (ruta de la imagen, cantidad real)
+    """
+    if spec.endswith((".yaml", ".yml")):
+        import yaml
+        with open(spec) as f:
+            config = yaml.safe_load(f)
+        root = config.get("path", "")
+        if not os.path.isabs(root):
+            root = os.path.join(os.path.dirname(os.path.abspath(spec)), root)
+        image_dir = os.path.join(root, config[split])
+    else:
+        image_dir = spec
+
+    counts_csv = os.path.join(image_dir, "conteos.csv")
+    if os.path.exists(counts_csv):
+        with open(counts_csv, newline="") as f:
+            samples = [(os.path.join(image_dir, row["ruta"]), int(row["cantidad"])) for row in csv.DictReader(f)]
+    else:
+        samples = []
+        for path in sorted(glob.glob(os.path.join(image_dir, "**", "*"), recursive=True)):
+            if not path.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            label_path = os.path.splitext(path)[0] + ".txt"
+            if not os.path.exists(label_path):
+                # Convención YOLO: .../images/<split>/x.jpg -> .../labels/<split>/x.txt
+                label_path = os.path.splitext(path.replace(f"{os.sep}images{os.sep}", f"{os.sep}labels{os.sep}"))[0] + ".txt"
+            samples.append((path, _count_labels(label_path)))
+
+    return samples[:limit] if limit else samples
+
+
+class PeakMemory:
+    """Muestrea el RSS del proceso en un hilo y guarda el pico."""
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+        try:
+            import psutil
+            self._process = psutil.Process()
+        except ImportError:
+            self._process = None
+
+    def _rss(self):
+        """RSS actual en bytes (o el máximo histórico si no hay psutil)."""
+        if self._process is not None:
+            return self._process.memory_info().rss
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self._rss())
+
+    def __enter__(self):
+        self.peak = self._rss()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._rss())
+
+
+def _percentile(values, q):
+    """Percentil q (0-100) por el método del vecino más cercano."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def evaluate(samples, weight, modo, conf, imgsz):
+    """
+    Evalúa una configuración sobre todas las imagenes.
+
+    Args:
+        samples (list): Tuplas (ruta, cantidad real)
+        weight (str): Peso del modelo YOLO
+        modo (str): 'normal' o 'ROI'
+        conf (float): Confianza del modelo
+        imgsz (int or str): Tamaño de entrada, None para el de ultralytics o 'auto'
+
+    Returns:
+        dict: Métricas de la configuración
+    """
+    # Memoria del proceso antes de cargar el modelo (en evaluate_isolated, un proceso nuevo)
+    baseline = PeakMemory()._rss()
+
+    # Se calienta el modelo con la primera imagen para no medir la carga
+    Runner(samples[0][0], modo, conf, weight, save=False, imgsz=imgsz)
+
+    errors, latencies = [], []
+    with PeakMemory() as memory:
+        for path, real in samples:
+            start = time.perf_counter()
+            predicted = Runner(path, modo, conf, weight, save=False, imgsz=imgsz)
+            latencies.append((time.perf_counter() - start) * 1000)
+            errors.append(predicted - real)
+
+    n = len(errors)
+    return {
+        "modelo": weight,
+        "modo": modo,
+        "conf": conf,
+        "imgsz": imgsz or "default",  # "default" es el tamaño de ultralytics, "auto" el de InferenceSizer
+        "imagenes": n,
+        "mae": sum(abs(e) for e in errors) / n,
+        "mse": sum(e * e for e in errors) / n,
+        "sesgo": sum(errors) / n,
+        "p50_ms": _percentile(latencies, 50),
+        "p95_ms": _percentile(latencies, 95),
+        "pico_memoria_mb": memory.peak / 1024 ** 2,
+        "incremento_memoria_mb": (memory.peak - baseline) / 1024 ** 2
+    }
+
+
+def evaluate_isolated(samples, weight, modo, conf, imgsz):
+    """
+    Igual que evaluate, pero en un proceso nuevo que solo carga este modelo.
+
+    Returns:
+        dict: Métricas de la configuración
+    """
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(evaluate, samples, weight, modo, conf, imgsz).result()
+
+
+def pareto_front(rows, error_key="mae", cost_key="p50_ms"):
+    """
+    Marca las configuraciones que no son dominadas en error y costo.
+
+    Args:
+        rows (list): Resultados de evaluate
+        error_key (str): Métrica de error a minimizar
+        cost_key (str): Métrica de costo a minimizar
+
+    Returns:
+        list: Configuraciones de la frontera, ordenadas por costo
+    """
+    front = []
+    for row in rows:
+        dominated = any(
+            other[error_key] <= row[error_key] and other[cost_key] <= row[cost_key]
+            and (other[error_key] < row[error_key] or other[cost_key] < row[cost_key])
+            for other in rows
+        )
+        row["pareto"] = not dominated
+        if not dominated:
+            front.append(row)
+    return sorted(front, key=lambda row: row[cost_key])
+
+
+def main():
+    """Punto de entrada de la línea de comandos."""
+    parser = argparse.ArgumentParser(description="Barrido de precisión contra latencia de Runner.")
+    parser.add_argument("dataset", help="Yaml de dataset (ej. jhu_crowdV3.yaml) o carpeta local anotada")
+    parser.add_argument("--split", default="val")
+    parser.add_argument("--limite", type=int, default=None, help="Máximo de imagenes a evaluar")
+    parser.add_argument("--modelos", nargs="+", default=["yolov8n.pt", "yolov8s.pt", "yolov8m.pt", "yolov8x.pt"])
+    parser.add_argument("--modos", nargs="+", default=["normal", "ROI"], choices=["normal", "ROI"])
+    parser.add_argument("--conf", nargs="+", type=float, default=[0.1, 0.2, 0.3])
+    parser.add_argument("--imgsz", nargs="+", type=lambda v: v if v == "auto" else int(v), default=[0],
+                        help="Tamaños de entrada, 0 usa el de ultralytics y 'auto' uno por forma de imagen")
+    parser.add_argument("--objetivo-mae", type=float, default=None, help="MAE máximo aceptable para el sitio")
+    parser.add_argument("--salida", default="barrido.csv", help="CSV con todas las configuraciones")
+    args = parser.parse_args()
+
+    samples = load_dataset(args.dataset, args.split, args.limite)
+    if not samples:
+        raise SystemExit(f"No se encontraron imagenes anotadas en {args.dataset} ({args.split}).")
+    print(f"Imagenes anotadas: {len(samples)}")
+
+    rows = []
+    for weight, modo, conf, imgsz in product(args.modelos, args.modos, args.conf, args.imgsz):
+        row = evaluate_isolated(samples, weight, modo, conf, imgsz or None)
+        print(f"{weight} {modo} conf={conf} imgsz={row['imgsz']}: MAE {row['mae']:.2f}, "
+              f"p50 {row['p50_ms']:.0f} ms, p95 {row['p95_ms']:.0f} ms, {row['pico_memoria_mb']:.0f} MB")
+        rows.append(row)
+
+    front = pareto_front(rows)
+    with open(args.salida, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Resultados guardados en {args.salida}")
+
+    print(" ------------------------- Frontera de Pareto (MAE vs p50) -------------------------")
+    for row in front:
+        print(f"  {row['modelo']} {row['modo']} conf={row['conf']} imgsz={row['imgsz']}: "
+              f"MAE {row['mae']:.2f}, p50 {row['p50_ms']:.0f} ms, {row['pico_memoria_mb']:.0f} MB")
+
+    if args.objetivo_mae is not None:
+        candidates = [row for row in front if row["mae"] <= args.objetivo_mae]
+        if candidates:
+            best = candidates[0]
+            print(f"Configuración más barata con MAE <= {args.objetivo_mae}: {best['modelo']} {best['modo']} "
+                  f"conf={best['conf']} imgsz={best['imgsz']} ({best['p50_ms']:.0f} ms)")
+        else:
+            print(f"Ninguna configuración cumple MAE <= {args.objetivo_mae}.")
+
+
+if __name__ == "__main__":
+    main()
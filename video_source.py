@@ -0,0 +1,461 @@
+import os
+import time
+import threading
+import cv2
+
+
+class FrameSource:
+    """
+    Fuente de frames con la misma interfaz que cv2.VideoCapture (isOpened,
+    read, grab, retrieve, release) para que CameraModule pueda usar
+    indistintamente una cámara local, un archivo de video o un stream de red.
+    """
+    def __init__(self, spec):
+        """
+        Args:
+            spec (int or str): Índice de la cámara, ruta del archivo o URL del stream
+        """
+        self.spec = spec
+        self.cap = None
+
+    def open(self):
+        """Abre (o vuelve a abrir) la fuente."""
+        self.release()
+        self.cap = cv2.VideoCapture(self.spec)
+        return self.isOpened()
+
+    def isOpened(self):
+        """Retorna True si la fuente está abierta."""
+        return self.cap is not None and self.cap.isOpened()
+
+    def grab(self):
+        """Avanza un frame sin convertirlo a BGR."""
+        return self.cap.grab()
+
+    def retrieve(self):
+        """Convierte a BGR el último frame avanzado con grab."""
+        return self.cap.retrieve()
+
+    def read(self):
+        """Lee el siguiente frame."""
+        return self.cap.read()
+
+    def release(self):
+        """Libera la fuente."""
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.spec!r})"
+
+
+class VideoFileSource(FrameSource):
+    """
+    Archivo de video (por ejemplo un MP4 grabado) leído con salto de frames.
+
+    Los frames intermedios solo se avanzan con grab(), sin convertirlos a un
+    array BGR completo, y solo se hace retrieve() del frame que se entrega.
+    """
+    def __init__(self, path, every_n=1, every_seconds=None, start_seconds=None, loop=False):
+        """
+        Args:
+            path (str): Ruta del archivo de video
+            every_n (int): Entregar uno de cada every_n frames
+            every_seconds (float): Entregar un frame cada every_seconds segundos
+                de video (tiene prioridad sobre every_n)
+            start_seconds (float): Segundo del video desde el que se parte
+            loop (bool): Volver al inicio al llegar al final del archivo
+        """
+        super().__init__(path)
+        self.every_n = max(1, int(every_n))
+        self.every_seconds = every_seconds
+        self.start_seconds = start_seconds
+        self.loop = loop
+        self.fps = 0.0
+        self.frame_count = 0
+        self._next_ms = None  # Timestamp del próximo frame a entregar (modo every_seconds)
+
+    def open(self):
+        """Abre el archivo y se posiciona en start_seconds si se indicó."""
+        if not super().open():
+            return False
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 0.0
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self._next_ms = None
+        if self.start_seconds:
+            self.seek(self.start_seconds)
+        return True
+
+    def position(self):
+        """Retorna la posición actual en segundos."""
+        return self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+
+    def seek(self, seconds):
+        """
+        Se posiciona en un timestamp del archivo.
+
+        Args:
+            seconds (float): Segundo del video
+
+        Returns:
+            bool: True si el backend aceptó la posición
+        """
+        self._next_ms = seconds * 1000.0
+        return self.cap.set(cv2.CAP_PROP_POS_MSEC, seconds * 1000.0)
+
+    def _rewind(self):
+        """Vuelve al inicio del archivo si está en modo loop."""
+        if not self.loop:
+            return False
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        self._next_ms = None
+        return True
+
+    def read(self):
+        """
+        Entrega el siguiente frame según el salto configurado.
+
+        Returns:
+            tuple: (ret, frame) como cv2.VideoCapture.read
+        """
+        if self.every_seconds:
+            return self._read_every_seconds()
+
+        for _ in range(self.every_n):
+            if not self.cap.grab():
+                if not self._rewind() or not self.cap.grab():
+                    return False, None
+        return self.cap.retrieve()
+
+    def _read_every_seconds(self):
+        """Avanza con grab hasta el próximo timestamp y entrega ese frame."""
+        while True:
+            if not self.cap.grab():
+                if not self._rewind() or not self.cap.grab():
+                    return False, None
+            ms = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+            if self._next_ms is None or ms >= self._next_ms:
+                self._next_ms = ms + self.every_seconds * 1000.0
+                return self.cap.retrieve()
+
+
+class LatestFrameGrabber:
+    """
+    Hilo que llama grab() continuamente sobre una captura para vaciar el
+    buffer interno del backend, de modo que el frame entregado sea siempre el
+    más nuevo y no uno encolado hace varios frames.
+
+    Solo este hilo toca la captura: read() deja una solicitud y el hilo hace
+    retrieve() del siguiente frame que avance, dejándolo en un único slot.
+    """
+    def __init__(self, cap, name="LatestFrameGrabber"):
+        """
+        Args:
+            cap (cv2.VideoCapture): Captura ya abierta
+            name (str): Nombre del hilo
+        """
+        self.cap = cap
+        self._lock = threading.Lock()
+        self._requested = False
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._slot = (False, None)
+        self.grabbed = 0  # Frames avanzados
+        self.failures = 0  # grab fallidos seguidos
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        """Loop del hilo: grab continuo y retrieve solo cuando se pide."""
+        while not self._stop.is_set():
+            ok = self.cap.grab()
+            if not ok:
+                self.failures += 1
+                self._stop.wait(0.01)
+            else:
+                self.failures = 0
+                self.grabbed += 1
+            with self._lock:
+                requested = self._requested
+            if requested:
+                ret, frame = self.cap.retrieve() if ok else (False, None)
+                with self._lock:
+                    self._slot = (ret, frame)
+                    self._requested = False
+                self._ready.set()
+
+    def read(self, timeout=2.0):
+        """
+        Entrega el frame más nuevo.
+
+        Args:
+            timeout (float): Segundos máximos de espera
+
+        Returns:
+            tuple: (ret, frame) como cv2.VideoCapture.read
+        """
+        if self._stop.is_set():
+            return False, None
+        with self._lock:
+            self._ready.clear()
+            self._requested = True
+        if not self._ready.wait(timeout) or self._stop.is_set():
+            return False, None
+        with self._lock:
+            return self._slot
+
+    def stop(self):
+        """Detiene el hilo y espera a que termine."""
+        self._stop.set()
+        self._ready.set()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+
+
+class LiveSource(FrameSource):
+    """
+    Fuente en vivo (cámara o stream). Con latest_only usa un LatestFrameGrabber
+    para entregar siempre el frame más reciente en vez de uno encolado, y
+    grab/retrieve quedan a cargo de ese hilo.
+    """
+    def __init__(self, spec, latest_only=False):
+        """
+        Args:
+            spec (int or str): Índice de la cámara o URL del stream
+            latest_only (bool): Usar el hilo de grab continuo
+        """
+        super().__init__(spec)
+        self.latest_only = latest_only
+        self.grabber = None
+
+    def open(self):
+        """Abre la fuente y, si corresponde, inicia el hilo de grab."""
+        if not super().open():
+            return False
+        if self.latest_only:
+            self.grabber = LatestFrameGrabber(self.cap, name=f"Grabber {self.spec}")
+        return True
+
+    def read(self):
+        """Entrega el frame más nuevo de la fuente."""
+        if self.grabber is not None:
+            return self.grabber.read()
+        return self.cap.read()
+
+    def release(self):
+        """Detiene el hilo de grab y libera la fuente."""
+        if self.grabber is not None:
+            self.grabber.stop()
+            self.grabber = None
+        super().release()
+
+
+class DeviceSource(LiveSource):
+    """
+    Cámara local, equivalente a cv2.VideoCapture(camera_index). V4L2 encola
+    varios frames, por lo que sin latest_only el frame leído puede tener
+    varios buffers de antigüedad.
+    """
+    def __init__(self, camera_index=0, latest_only=False):
+        super().__init__(camera_index, latest_only)
+
+
+class StreamSource(LiveSource):
+    """Stream de red (RTSP, HTTP, etc.), por defecto con latest_only."""
+    def __init__(self, url, latest_only=True):
+        super().__init__(url, latest_only)
+
+
+class ImageFolderSource(FrameSource):
+    """
+    Reproduce como fuente las imagenes de una carpeta o patrón glob (por
+    ejemplo capturas archivadas), en orden y opcionalmente en loop.
+    """
+    def __init__(self, pattern, loop=True):
+        """
+        Args:
+            pattern (str): Carpeta o patrón glob de imagenes
+            loop (bool): Volver a la primera imagen al terminar
+        """
+        super().__init__(pattern)
+        self.loop = loop
+        self.paths = []
+        self._index = 0
+
+    def open(self):
+        """Lista las imagenes de la carpeta."""
+        import glob
+
+        pattern = os.path.join(self.spec, "*") if os.path.isdir(self.spec) else self.spec
+        self.paths = sorted(path for path in glob.glob(pattern)
+                            if path.lower().endswith((".jpg", ".jpeg", ".png", ".bmp")))
+        self._index = 0
+        return self.isOpened()
+
+    def isOpened(self):
+        return len(self.paths) > 0
+
+    def read(self):
+        """Entrega la siguiente imagen de la carpeta."""
+        if self._index >= len(self.paths):
+            if not self.loop or not self.paths:
+                return False, None
+            self._index = 0
+        frame = cv2.imread(self.paths[self._index])
+        self._index += 1
+        return frame is not None, frame
+
+    def grab(self):
+        return self._index < len(self.paths) or (self.loop and len(self.paths) > 0)
+
+    def retrieve(self):
+        return self.read()
+
+    def release(self):
+        self.paths = []
+
+
+class SyntheticSource(FrameSource):
+    """
+    Fuente sintética para pruebas largas sin cámara: ruido con variaciones de
+    brillo y rectángulos que se mueven, generado con una semilla fija. Cada
+    frame pasa por una codificación JPEG, así sus métricas son comparables
+    con las de las fotos ya guardadas y CameraModule no lo toma por corrupto.
+
+    grab() avanza al ritmo de fps como una cámara real, así con latest_only
+    la fuente corre un LatestFrameGrabber igual que una cámara en vivo.
+    """
+    def __init__(self, width=1280, height=720, seed=0, fps=30, latest_only=False):
+        """
+        Args:
+            width (int): Ancho de los frames
+            height (int): Alto de los frames
+            seed (int): Semilla del generador
+            fps (float): Frames por segundo que simula grab()
+            latest_only (bool): Usar el hilo de grab continuo, como LiveSource
+        """
+        super().__init__(f"synthetic:{width}x{height}")
+        self.width = width
+        self.height = height
+        self.seed = seed
+        self.fps = fps
+        self.latest_only = latest_only
+        self.grabber = None
+        self._rng = None
+        self._frame = 0
+
+    def open(self):
+        import numpy as np
+
+        self.release()
+        self._rng = np.random.default_rng(self.seed)
+        self._frame = 0
+        if self.latest_only:
+            self.grabber = LatestFrameGrabber(self, name=f"Grabber {self.spec}")
+        return True
+
+    def isOpened(self):
+        return self._rng is not None
+
+    def read(self):
+        """Entrega el siguiente frame (el más nuevo si hay hilo de grab)."""
+        if self.grabber is not None:
+            return self.grabber.read()
+        return self.retrieve()
+
+    def retrieve(self):
+        """Genera un frame."""
+        rng = self._rng
+        if rng is None:
+            return False, None
+        base = int(rng.integers(90, 140))
+        frame = rng.integers(base - 60, base + 60, size=(self.height, self.width, 3), dtype="uint8")
+        for i in range(8):
+            x = (self._frame * (5 + i) + i * 150) % max(1, self.width - 60)
+            y = (i * 80) % max(1, self.height - 120)
+            cv2.rectangle(frame, (x, y), (x + 40, y + 110), (20 * i, 255 - 20 * i, 60), -1)
+        self._frame += 1
+        # Misma codificación que usa cv2.imwrite al guardar la foto
+        ok, encoded = cv2.imencode(".jpg", frame)
+        if not ok:
+            return False, None
+        return True, cv2.imdecode(encoded, cv2.IMREAD_COLOR)
+
+    def grab(self):
+        time.sleep(1 / self.fps)
+        return self.isOpened()
+
+    def release(self):
+        if self.grabber is not None:
+            self.grabber.stop()
+            self.grabber = None
+        self._rng = None
+
+
+def _supported_options(cls, kwargs):
+    """Retorna las opciones que acepta la fuente cls, avisando las que se ignoran."""
+    import inspect
+
+    accepted = inspect.signature(cls.__init__).parameters
+    ignored = sorted(name for name in kwargs if name not in accepted)
+    if ignored:
+        print(f"{cls.__name__} no usa las opciones {ignored}, se ignoran.")
+    return {name: value for name, value in kwargs.items() if name in accepted}
+
+
+def open_source(spec, **kwargs):
+    """
+    Crea la fuente adecuada según su especificación.
+
+    Args:
+        spec (int or str): Índice de cámara, URL de un stream (rtsp://, http://, ...),
+            ruta de un archivo de video, carpeta o glob de imagenes, o 'synthetic'
+        **kwargs: Opciones de la fuente (every_n, every_seconds, latest_only, ...).
+            Las opciones que el tipo de fuente no usa se ignoran con un aviso, por
+            ejemplo latest_only en archivos de video (donde no hay frames viejos)
+            o every_seconds en una cámara
+
+    Returns:
+        FrameSource: Fuente sin abrir
+    """
+    if isinstance(spec, FrameSource):
+        return spec
+    if isinstance(spec, int) or (isinstance(spec, str) and spec.isdigit()):
+        cls, spec = DeviceSource, int(spec)
+    elif "://" in spec:
+        cls = StreamSource
+    elif spec.startswith("synthetic"):
+        return SyntheticSource(**_supported_options(SyntheticSource, kwargs))
+    elif spec.lower().endswith((".jpg", ".jpeg", ".png", ".bmp")) or os.path.isdir(spec) or "*" in spec:
+        cls = ImageFolderSource
+    else:
+        cls = VideoFileSource
+    return cls(spec, **_supported_options(cls, kwargs))
+
+
+if __name__ == "__main__":
+    # Prueba rápida con un archivo local:
+    #   python video_source.py video.mp4 [cada_n_frames | Ts]
+    import sys
+
+    every = sys.argv[2] if len(sys.argv) > 2 else "30"
+    if every.endswith("s"):
+        source = VideoFileSource(sys.argv[1], every_seconds=float(every[:-1]))
+    else:
+        source = VideoFileSource(sys.argv[1], every_n=int(every))
+
+    if not source.open():
+        sys.exit(f"No se pudo abrir {sys.argv[1]}")
+    print(f"{source}: {source.frame_count} frames a {source.fps:.1f} fps")
+    start = time.perf_counter()
+    frames = 0
+    while True:
+        ret, frame = source.read()
+        if not ret:
+            break
+        frames += 1
+        print(f"  frame {frames}: t={source.position():.2f}s {frame.shape}")
+    elapsed = time.perf_counter() - start
+    print(f"{frames} frames entregados en {elapsed:.2f}s")
+    source.release()